@@ -2,58 +2,161 @@ import os
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
+import joblib
+from ingest import OUTPUT_DIR, CACHE_DIR, COUNT_COLUMNS, update_cache, load_aggregates
+from feature_store import get_features
+from reports import Table, write_report
 
-# Configuration
-BASE_DIR = r"z:\UIDAI"
-OUTPUT_DIR = os.path.join(BASE_DIR, "analysis_results")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+FEATURES = ['bio_ratio', 'enrol_0_5', 'total_bio']
+PINCODE_FEATURES = FEATURES + ['active_days', 'peak_day_share']
+MODEL_DIR = os.path.join(CACHE_DIR, "models")
+ANOMALY_LOG = os.path.join(OUTPUT_DIR, "anomaly_log.parquet")
+SCORE_BATCH = 100_000
 
-def load_data():
-    # Hacky import to avoid circular dep issues in this environment
-    import sys
-    sys.path.append(BASE_DIR)
-    if os.path.exists(os.path.join(BASE_DIR, "analyze_insights.py")):
-        from analyze_insights import load_data as ld
-        return ld()
-    return {}
+def score_in_batches(model, X, batch=SCORE_BATCH):
+    """IsolationForest scores computed over fixed-size slices to bound memory."""
+    return np.concatenate([model.score_samples(X[i:i + batch]) for i in range(0, len(X), batch)])
 
-def find_outliers(dfs):
-    print("Detecting Statistical Anomalies...")
-    
-    # 1. Aggregate Features (Reuse Logic)
-    enrol = dfs['enrolment'].groupby(['state', 'district']).sum(numeric_only=True).reset_index()
-    bio = dfs['biometric'].groupby(['state', 'district']).sum(numeric_only=True).reset_index()
-    
-    bio_cols = [c for c in bio.columns if 'age' in c]
-    bio['total_bio'] = bio[bio_cols].sum(axis=1)
-    
-    # Merge
-    df = pd.merge(enrol, bio[['state', 'district', 'total_bio']], on=['state', 'district'], how='outer').fillna(0)
-    df = df.rename(columns={'age_0_5': 'enrol_0_5'})
-    df['bio_ratio'] = df['total_bio'] / (df['enrol_0_5'] + 1)
+def find_outliers(features, contamination=0.01, level='district', max_report_rows=100):
+    print(f"Detecting Statistical Anomalies ({level} level)...")
     
-    X = df[['bio_ratio', 'enrol_0_5', 'total_bio']].fillna(0)
+    # 1. Features: biometric updates relative to infant enrolment (+ burstiness per pincode)
+    feature_cols = PINCODE_FEATURES if level == 'pincode' else FEATURES
+    df = features[feature_cols].reset_index()
+    X = df[feature_cols].fillna(0).to_numpy()
     
-    # Isolation Forest
-    iso = IsolationForest(contamination=0.01, random_state=42)
-    df['anomaly'] = iso.fit_predict(X)
+    # Isolation Forest: fit on a subsample, score everything in chunks
+    iso = IsolationForest(contamination=contamination, max_samples=min(256, len(X)), random_state=42, n_jobs=-1)
+    iso.fit(X)
+    df['anomaly_score'] = score_in_batches(iso, X)
+    df['anomaly'] = np.where(df['anomaly_score'] < iso.offset_, -1, 1)
     
-    outliers = df[df['anomaly'] == -1]
+    outliers = df[df['anomaly'] == -1].sort_values('anomaly_score')
     
     print(f"Found {len(outliers)} anomalies.")
     
-    report_path = os.path.join(OUTPUT_DIR, "anomaly_report.md")
-    with open(report_path, "w") as f:
-        f.write("# Anomaly Detection Report\n\n")
-        f.write("Districts with statistically unusual patterns (e.g., abnormally high updates vs enrolments).\n\n")
-        f.write("| State | District | Enrol (0-5) | Bio Updates | Ratio |\n")
-        f.write("|---|---|---|---|---|\n")
-        for _, row in outliers.iterrows():
-            f.write(f"| {row['state']} | {row['district']} | {int(row['enrol_0_5'])} | {int(row['total_bio'])} | {row['bio_ratio']:.2f} |\n")
+    common = [('state', 'State', '%s'), ('district', 'District', '%s')]
+    if level == 'pincode':
+        report_path = write_report("pincode_anomaly_report", [
+            "# Pincode Anomaly Report\n\n",
+            f"Most unusual pincodes (top {max_report_rows} of {len(outliers)} flagged), e.g. bursts of "
+            "biometric updates concentrated on a few days.\n\n",
+            Table(outliers.head(max_report_rows), common + [
+                ('pincode', 'Pincode', '%d'), ('enrol_0_5', 'Enrol (0-5)', '%d'), ('total_bio', 'Bio Updates', '%d'),
+                ('bio_ratio', 'Ratio', '%.2f'), ('peak_day_share', 'Peak-day Share', '%.2f'), ('anomaly_score', 'Score', '%.3f')]),
+        ])[0]
+        print(f"Anomaly report saved to {report_path}")
+        return df
+    
+    report_path = write_report("anomaly_report", [
+        "# Anomaly Detection Report\n\n",
+        "Districts with statistically unusual patterns (e.g., abnormally high updates vs enrolments).\n\n",
+        Table(outliers, common + [('enrol_0_5', 'Enrol (0-5)', '%d'), ('total_bio', 'Bio Updates', '%d'),
+                                  ('bio_ratio', 'Ratio', '%.2f')]),
+    ])[0]
             
     print(f"Anomaly report saved to {report_path}")
+    return df
+
+def daily_features(aggs=None):
+    """Per-(state, district, date) anomaly features from the stored aggregates."""
+    if aggs is None:
+        update_cache()
+        aggs = load_aggregates(['enrolment', 'biometric'])
+    keys = ['state', 'district', 'date']
+    parts = []
+    if 'enrolment' in aggs:
+        parts.append(aggs['enrolment'].set_index(keys)[['age_0_5']].rename(columns={'age_0_5': 'enrol_0_5'}))
+    if 'biometric' in aggs:
+        bio = aggs['biometric'].set_index(keys)
+        parts.append(bio[COUNT_COLUMNS['biometric']].sum(axis=1).rename('total_bio').to_frame())
+    if not parts:
+        return pd.DataFrame(columns=keys + FEATURES)
+    df = pd.concat(parts, axis=1).reindex(columns=['enrol_0_5', 'total_bio']).fillna(0)
+    df['bio_ratio'] = df['total_bio'] / (df['enrol_0_5'] + 1)
+    df = df.reset_index().dropna(subset=['date'])
+    return df[keys + FEATURES].sort_values('date', kind='stable', ignore_index=True)
+
+def fit_detector(daily, contamination=0.01, reference_days=90, max_samples=256,
+                 refit=False, model_dir=MODEL_DIR):
+    """IsolationForest fit once on the most recent reference window, then persisted.
+
+    The persisted model is reused only while its features and parameters match.
+    """
+    path = os.path.join(model_dir, "anomaly_detector.joblib")
+    params = {'features': FEATURES, 'contamination': contamination, 'reference_days': reference_days,
+              'max_samples': max_samples}
+    if os.path.exists(path) and not refit:
+        state = joblib.load(path)
+        if all(state.get(k) == v for k, v in params.items()):
+            return state
+    start = daily['date'].max() - pd.Timedelta(days=reference_days)
+    reference = daily[daily['date'] > start]
+    print(f"Fitting anomaly detector on {len(reference):,} district-days since {start:%d-%m-%Y}...")
+    iso = IsolationForest(contamination=contamination, max_samples=min(max_samples, len(reference)),
+                          random_state=42, n_jobs=-1)
+    iso.fit(reference[FEATURES].to_numpy())
+    state = dict(params, model=iso, reference_end=daily['date'].max())
+    os.makedirs(model_dir, exist_ok=True)
+    joblib.dump(state, path)
+    return state
+
+def score_new_days(daily=None, contamination=0.01, reference_days=90, refit=False, log_path=ANOMALY_LOG):
+    """Score district-days that are new or changed since the anomaly log was written.
+
+    A district-day is rescored when it is missing from the log or its
+    counts differ from the logged ones, so late shards for earlier days
+    are picked up; its old log entry is replaced. Scoring runs in
+    fixed-size vectorized batches, so a nightly drop costs only the
+    district-days it touched.
+    """
+    if daily is None:
+        daily = daily_features()
+    if daily.empty:
+        return pd.DataFrame()
+    state = fit_detector(daily, contamination, reference_days, refit=refit)
+    
+    keys = ['state', 'district', 'date']
+    daily = daily.astype({'state': str, 'district': str})
+    log = pd.read_parquet(log_path) if os.path.exists(log_path) and not refit else None
+    if log is None or log.empty:
+        new = daily
+    else:
+        # Anti-join on key and counts: unchanged district-days are already scored
+        seen = daily.merge(log[keys + ['enrol_0_5', 'total_bio']].drop_duplicates(), how='left', indicator=True)
+        new = daily[(seen['_merge'] == 'left_only').to_numpy()]
+    if new.empty:
+        print("No new or changed district-days to score.")
+        return new
+    
+    scores = score_in_batches(state['model'], new[FEATURES].to_numpy())
+    new = new.assign(anomaly_score=scores, anomaly=scores < state['model'].offset_)
+    
+    if log is not None:
+        stale = pd.MultiIndex.from_frame(log[keys]).isin(pd.MultiIndex.from_frame(new[keys]))
+        log = pd.concat([log[~stale], new], ignore_index=True)
+    else:
+        log = new
+    log.to_parquet(log_path, index=False)
+    print(f"Scored {len(new):,} district-days over {new['date'].nunique()} day(s); "
+          f"{int(new['anomaly'].sum())} flagged. Log: {log_path}")
+    write_daily_report(new[new['anomaly']])
+    return new
+
+def write_daily_report(flagged):
+    report_path = write_report("daily_anomaly_report", [
+        "# Daily Anomaly Report\n\n",
+        "District-days flagged in the latest scoring run (lower score = more unusual).\n\n",
+        Table(flagged.sort_values('anomaly_score'), [
+            ('date', 'Date', '%d-%m-%Y'), ('state', 'State', '%s'), ('district', 'District', '%s'),
+            ('enrol_0_5', 'Enrol (0-5)', '%d'), ('total_bio', 'Bio Updates', '%d'), ('bio_ratio', 'Ratio', '%.2f'),
+            ('anomaly_score', 'Score', '%.3f')]),
+    ])[0]
+    print(f"Daily anomaly report saved to {report_path}")
 
 if __name__ == "__main__":
-    dfs = load_data()
-    find_outliers(dfs)
+    import sys
+    if '--pincode' in sys.argv:
+        find_outliers(get_features(PINCODE_FEATURES, level='pincode'), level='pincode')
+    find_outliers(get_features(FEATURES))
+    score_new_days(refit='--refit' in sys.argv)
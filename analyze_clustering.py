@@ -1,67 +1,138 @@
 import os
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
+import joblib
+from joblib import Parallel, delayed
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
 from sklearn.preprocessing import StandardScaler
+from ingest import OUTPUT_DIR, CACHE_DIR, CHUNK_ROWS
+from feature_store import get_features, iter_features
 
-# Configuration
-BASE_DIR = r"z:\UIDAI"
-OUTPUT_DIR = os.path.join(BASE_DIR, "analysis_results")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+FEATURES = ['total_enrol', 'update_intensity', 'child_share', 'migration_score']
+# Pincode clustering adds the burstiness signals from the activity matrix
+PINCODE_FEATURES = FEATURES + ['active_days', 'peak_day_share']
+# Written alongside the labels for the dashboard
+COLUMNS = FEATURES + ['total_updates', 'enrol_0_5', 'enrol_5_17']
+PINCODE_COLUMNS = PINCODE_FEATURES + ['total_updates', 'enrol_0_5', 'enrol_5_17']
+MODEL_DIR = os.path.join(CACHE_DIR, "models")
+SAMPLE_ROWS = 20_000
 
-def load_data():
-    import sys
-    sys.path.append(BASE_DIR)
-    # Hacky import to avoid circular dep issues in this environment
-    if os.path.exists(os.path.join(BASE_DIR, "analyze_insights.py")):
-        from analyze_insights import load_data as ld
-        return ld()
-    return {}
+def feature_chunks(features, columns, level, chunk_rows):
+    """Feature chunks from an in-memory frame, or streamed from the store when features is None."""
+    if features is None:
+        yield from iter_features(columns, level=level, chunk_rows=chunk_rows)
+        return
+    for i in range(0, len(features), chunk_rows):
+        yield features[columns].iloc[i:i + chunk_rows]
 
-def run_kmeans(dfs):
-    print("Performing District DNA Clustering...")
-    
-    # 1. Aggregate Features
-    # We need: Enrolment Volume, Update Volume, Child Ratio
-    
-    enrol = dfs['enrolment'].groupby(['state', 'district']).sum(numeric_only=True).reset_index()
-    bio = dfs['biometric'].groupby(['state', 'district']).sum(numeric_only=True).reset_index()
-    demo = dfs['demographic'].groupby(['state', 'district']).sum(numeric_only=True).reset_index()
-    
-    # Rename
-    enrol = enrol.rename(columns={'age_0_5': 'enrol_0_5', 'age_5_17': 'enrol_5_17', 'age_18_greater': 'enrol_18_plus'})
-    bio_cols = [c for c in bio.columns if 'age' in c]
-    bio['total_bio'] = bio[bio_cols].sum(axis=1)
-    
-    demo_cols = [c for c in demo.columns if 'age' in c]
-    demo['total_demo'] = demo[demo_cols].sum(axis=1)
+def score_k(sample, k, random_state=42):
+    model = MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=3, batch_size=4096).fit(sample)
+    silhouette = silhouette_score(sample, model.labels_, sample_size=min(5000, len(sample)), random_state=random_state)
+    return {'k': k, 'inertia': model.inertia_, 'silhouette': silhouette}
+
+def sweep_k(sample, k_values, n_jobs=-1):
+    """Fit each candidate k on the sample in parallel; pick the best silhouette."""
+    k_values = [k for k in k_values if k < len(sample)]
+    scores = pd.DataFrame(Parallel(n_jobs=n_jobs)(delayed(score_k)(sample, k) for k in k_values))
+    print(scores.to_string(index=False, float_format='%.3f'))
+    return int(scores.loc[scores['silhouette'].idxmax(), 'k']), scores
+
+def stable_labels(previous, centroids, scaler):
+    """Map new cluster ids onto the previous run's ids by matching centroids.
+
+    Centroids are compared in the current scaled space and paired with the
+    Hungarian algorithm; clusters with no counterpart get fresh ids.
+    Returns mapping[new_id] -> stable_id.
+    """
+    mapping = np.full(len(centroids), -1)
+    if previous is not None and len(previous):
+        old_ids = np.array(list(previous.keys()))
+        old = scaler.transform(pd.DataFrame(list(previous.values()), columns=scaler.feature_names_in_))
+        new = scaler.transform(pd.DataFrame(centroids, columns=scaler.feature_names_in_))
+        cost = np.linalg.norm(new[:, None, :] - old[None, :, :], axis=2)
+        rows, cols = linear_sum_assignment(cost)
+        mapping[rows] = old_ids[cols]
+    next_id = max(previous or {-1: None}) + 1
+    for i in np.flatnonzero(mapping < 0):
+        mapping[i] = next_id
+        next_id += 1
+    return mapping
+
+def run_kmeans(features, n_clusters=4, level='district', mode=None, sweep=None,
+               chunk_rows=CHUNK_ROWS, epochs=3, n_jobs=-1, model_dir=MODEL_DIR):
+    """Cluster districts (or pincodes) into segments with stable ids across runs.
+
+    mode='batch' fits KMeans on the full table. mode='minibatch' (default for
+    pincodes) is out-of-core: the scaler and MiniBatchKMeans are fit with
+    partial_fit over feature chunks, streamed from the feature store when
+    features is None. With sweep (a range of k), k is chosen by silhouette
+    on a sample. Labels are matched to the previously persisted model.
+    """
+    print(f"Performing {level.capitalize()} DNA Clustering...")
+    mode = mode or ('minibatch' if level == 'pincode' else 'batch')
     
-    # Merge
-    df = pd.merge(enrol, bio[['state', 'district', 'total_bio']], on=['state', 'district'], how='outer').fillna(0)
-    df = pd.merge(df, demo[['state', 'district', 'total_demo']], on=['state', 'district'], how='outer').fillna(0)
+    # 1. Features: Enrolment Volume, Update Intensity, Child Share, Migration
+    feature_cols = PINCODE_FEATURES if level == 'pincode' else FEATURES
+    columns = PINCODE_COLUMNS if level == 'pincode' else COLUMNS
+    chunks = lambda: feature_chunks(features, columns, level, chunk_rows)
     
-    df['total_enrol'] = df['enrol_0_5'] + df['enrol_5_17'] + df['enrol_18_plus']
-    df['total_updates'] = df['total_bio'] + df['total_demo']
+    # 2. Scale (one pass), keeping a bounded sample for the k-sweep
+    scaler = StandardScaler()
+    samples = []
+    for chunk in chunks():
+        X = chunk[feature_cols].fillna(0)
+        scaler.partial_fit(X)
+        samples.append(X.sample(n=min(len(X), SAMPLE_ROWS), random_state=42))
+    sample = pd.concat(samples)
+    sample = scaler.transform(sample.sample(n=min(len(sample), SAMPLE_ROWS), random_state=42))
     
-    df['intensity'] = df['total_updates'] / (df['total_enrol'] + 1)
-    df['child_share'] = (df['enrol_0_5'] + df['enrol_5_17']) / (df['total_enrol'] + 1)
-    df['mig_idx'] = df['total_demo'] / (df['total_bio'] + 1)
-    features = ['total_enrol', 'intensity', 'child_share', 'mig_idx']
-    X = df[features].fillna(0)
+    if sweep:
+        n_clusters, scores = sweep_k(sample, sweep, n_jobs)
+        scores.to_csv(os.path.join(OUTPUT_DIR, f"{level}_k_sweep.csv"), index=False)
+        print(f"Chose k={n_clusters}")
     
-    # Scale
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    # 3. Fit
+    if mode == 'batch':
+        X_all = pd.concat([c[feature_cols].fillna(0) for c in chunks()])
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10).fit(scaler.transform(X_all))
+    else:
+        # ~27x more entities than districts: mini-batches keep this to seconds
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=4096)
+        for _ in range(epochs):
+            for chunk in chunks():
+                X = scaler.transform(chunk[feature_cols].fillna(0))
+                for i in range(0, len(X), kmeans.batch_size):
+                    kmeans.partial_fit(X[i:i + kmeans.batch_size])
     
-    kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
-    df['cluster'] = kmeans.fit_predict(X_scaled)
+    # 4. Keep segment ids stable against the last persisted model
+    model_path = os.path.join(model_dir, f"{level}_clusters.joblib")
+    previous = joblib.load(model_path) if os.path.exists(model_path) else None
+    previous = previous['centroids'] if previous and previous['features'] == feature_cols else None
+    centroids = scaler.inverse_transform(kmeans.cluster_centers_)
+    mapping = stable_labels(previous, centroids, scaler)
     
-    output_file = os.path.join(OUTPUT_DIR, "district_clusters.csv")
-    df.to_csv(output_file, index=False)
+    # 5. Label chunk by chunk
+    output_file = os.path.join(OUTPUT_DIR, f"{level}_clusters.csv")
+    labelled = []
+    for i, chunk in enumerate(chunks()):
+        df = chunk.reset_index()
+        df['cluster'] = mapping[kmeans.predict(scaler.transform(chunk[feature_cols].fillna(0)))]
+        df.to_csv(output_file, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+        labelled.append(df)
     print(f"Cluster data saved to {output_file}")
     
-    return df
+    os.makedirs(model_dir, exist_ok=True)
+    joblib.dump({'scaler': scaler, 'model': kmeans, 'mapping': mapping, 'features': feature_cols,
+                 'centroids': {int(mapping[i]): centroids[i].tolist() for i in range(len(centroids))}}, model_path)
+    
+    return pd.concat(labelled, ignore_index=True)
 
 if __name__ == "__main__":
-    dfs = load_data()
-    run_kmeans(dfs)
+    import sys
+    sweep = range(2, 13) if '--sweep' in sys.argv else None
+    if '--pincode' in sys.argv:
+        run_kmeans(None, n_clusters=8, level='pincode', sweep=sweep)
+    else:
+        run_kmeans(get_features(COLUMNS), sweep=sweep)
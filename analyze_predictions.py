@@ -1,96 +1,284 @@
 import os
 import pandas as pd
 import numpy as np
+from collections import namedtuple
+import joblib
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
+from ingest import OUTPUT_DIR, CACHE_DIR, CATEGORIES, COUNT_COLUMNS, WORKERS, update_cache, load_aggregates, process_pool
+from reports import Table, write_report
 
-# Configuration
-BASE_DIR = r"z:\UIDAI"
-OUTPUT_DIR = os.path.join(BASE_DIR, "analysis_results")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+MODEL_DIR = os.path.join(CACHE_DIR, "models")
+FEATURES = ['prev_mig_score', 'prev_demo', 'enrolment', 'biometric']
+TARGET = 'mig_score'
+HORIZONS = [7, 30]
+AR_LAGS = 7
 
-def get_training_data():
-    print("Loading data for prediction...")
-    import sys
-    sys.path.append(BASE_DIR)
-    from analyze_insights import load_data
+# Dense daily activity: values[category] is a (district x day) array whose
+# rows follow `districts` (a state/district frame) and columns follow `dates`.
+Panel = namedtuple('Panel', ['districts', 'dates', 'values'])
+
+def build_panel(aggs=None):
+    """Scatter the stored per-(state, district, date) aggregates into dense arrays."""
+    if aggs is None:
+        update_cache()
+        aggs = load_aggregates()
     
-    dfs = load_data()
+    # Flatten: one (state, district, date, category, value) log without a pivot
+    logs = []
+    for cat, agg in aggs.items():
+        agg = agg.dropna(subset=['date'])
+        if agg.empty: continue
+        logs.append(pd.DataFrame({
+            'state': agg['state'].astype(str),
+            'district': agg['district'].astype(str),
+            'date': agg['date'],
+            'category': CATEGORIES.index(cat),
+            'value': agg[COUNT_COLUMNS[cat]].sum(axis=1).to_numpy(dtype='float64'),
+        }))
+    if not logs:
+        return Panel(pd.DataFrame(columns=['state', 'district']), pd.DatetimeIndex([]), {})
+    log = pd.concat(logs, ignore_index=True)
     
-    # Flatten data
-    frames = []
+    # District and day ordinals
+    district_idx, districts = pd.MultiIndex.from_frame(log[['state', 'district']]).factorize(sort=True)
+    start = log['date'].min()
+    day_idx = ((log['date'] - start) // pd.Timedelta(days=1)).to_numpy()
+    dates = pd.date_range(start, log['date'].max(), freq='D')
     
-    for cat, df in dfs.items():
-        if df.empty: continue
-        # Identify value columns
-        val_cols = [c for c in df.columns if 'age' in c]
-        # Sum them to get 'count'
-        df['value'] = df[val_cols].sum(axis=1)
-        frames.append(process_df(df, cat, {}))
-        
-    if not frames:
+    tensor = np.zeros((len(CATEGORIES), len(districts), len(dates)))
+    np.add.at(tensor, (log['category'].to_numpy(), district_idx, day_idx), log['value'].to_numpy())
+    values = {cat: tensor[i] for i, cat in enumerate(CATEGORIES)}
+    return Panel(districts.to_frame(index=False, name=['state', 'district']), dates, values)
+
+def lagged(a):
+    """Shift a (district x day) array one day forward; day 0 has no lag."""
+    out = np.full_like(a, np.nan)
+    out[:, 1:] = a[:, :-1]
+    return out
+
+def get_training_data(aggs=None):
+    print("Loading data for prediction...")
+    panel = build_panel(aggs)
+    if not panel.values:
         return pd.DataFrame()
-        
-    full_log = pd.concat(frames)
     
-    pivot = raw_log.pivot_table(index=['date', 'state', 'district'], columns='category', values='value', aggfunc='sum').fillna(0).reset_index()
-    pivot['mig_score'] = pivot['demographic'] / (pivot['biometric'] + 1)
-    pivot = pivot.sort_values(['state', 'district', 'date'])
+    enrol, bio, demo = panel.values['enrolment'], panel.values['biometric'], panel.values['demographic']
+    mig_score = demo / (bio + 1)
+    features = {
+        'enrolment': enrol,
+        'biometric': bio,
+        'demographic': demo,
+        'mig_score': mig_score,
+        'prev_mig_score': lagged(mig_score),
+        'prev_demo': lagged(demo),
+    }
     
-    return pivot
+    # Keep district-days with any activity, in (district, date) order
+    d, t = np.nonzero((enrol + bio + demo) > 0)
+    out = panel.districts.iloc[d].reset_index(drop=True)
+    out['date'] = panel.dates[t]
+    for name, arr in features.items():
+        out[name] = arr[d, t]
+    return out
+
+def rmse(model, df):
+    return float(np.sqrt(mean_squared_error(df[TARGET], model.predict(df[FEATURES]))))
 
-def run_forecast(df):
-    print("Training Random Forest Model...")
+def backtest(df, folds=3, horizon=7, n_estimators=100, n_jobs=-1):
+    """Rolling-origin evaluation: fit on days before each origin, score the next `horizon` days."""
+    days = np.sort(df['date'].unique())
+    scores = []
+    for k in range(folds, 0, -1):
+        origin = len(days) - k * horizon
+        if origin < 1:
+            continue
+        train = df[df['date'] < days[origin]]
+        test = df[df['date'].isin(days[origin:origin + horizon])]
+        model = RandomForestRegressor(n_estimators=n_estimators, random_state=42, n_jobs=n_jobs)
+        model.fit(train[FEATURES], train[TARGET])
+        scores.append({'origin': pd.Timestamp(days[origin]), 'rmse': rmse(model, test)})
+        print(f"Backtest from {scores[-1]['origin']:%d-%m-%Y}: RMSE {scores[-1]['rmse']:.4f}")
+    return scores
+
+def row_hashes(df):
+    """uint64 hash of each training row: its (state, district, date) key, features and target."""
+    return pd.util.hash_pandas_object(df[['state', 'district', 'date'] + FEATURES + [TARGET]], index=False).to_numpy()
+
+def fit_forecaster(df, n_estimators=100, trees_per_update=10, max_estimators=300,
+                   n_jobs=-1, retrain=False, model_dir=MODEL_DIR):
+    """Load the persisted model and bring it up to date with df.
+
+    Rows already trained on are not refit: new or changed (district, date)
+    rows, whatever their date, grow the forest by trees_per_update
+    warm-started trees fit on those rows only. A full refit (with a
+    rolling-origin backtest) happens on first run, on retrain, when the
+    hyperparameters change, or once the forest would exceed max_estimators.
+    """
+    path = os.path.join(model_dir, "forecast.joblib")
+    params = {'features': FEATURES, 'n_estimators': n_estimators, 'trees_per_update': trees_per_update,
+              'max_estimators': max_estimators}
+    state = joblib.load(path) if os.path.exists(path) and not retrain else None
+    if state is not None and (state.get('params') != params or 'trained' not in state):
+        state = None
+    hashes = row_hashes(df)
+    new = df[~np.isin(hashes, state['trained'])] if state is not None else df
     
-    df['prev_mig_score'] = df.groupby(['state', 'district'])['mig_score'].shift(1)
-    df['prev_demo'] = df.groupby(['state', 'district'])['demographic'].shift(1)
+    if new.empty:
+        print(f"Reusing forecast model trained through {state['trained_through']:%d-%m-%Y}; no new or changed rows.")
+        return state
+    
+    if state is not None and state['model'].n_estimators + trees_per_update <= max_estimators:
+        model = state['model']
+        # Score the new rows before learning from them (out-of-sample)
+        state['update_rmse'] = rmse(model, new)
+        print(f"Model RMSE on {len(new):,} new or changed row(s) over {new['date'].nunique()} day(s): "
+              f"{state['update_rmse']:.4f}")
+        model.n_estimators += trees_per_update
+        model.fit(new[FEATURES], new[TARGET])
+    else:
+        print("Training Random Forest Model on full history...")
+        state = {'params': params, 'backtest': backtest(df, n_estimators=n_estimators, n_jobs=n_jobs)}
+        model = RandomForestRegressor(n_estimators=n_estimators, random_state=42, n_jobs=n_jobs, warm_start=True)
+        model.fit(df[FEATURES], df[TARGET])
+        state['model'] = model
     
+    state['trained'] = np.unique(hashes)
+    state['trained_through'] = df['date'].max()
+    os.makedirs(model_dir, exist_ok=True)
+    joblib.dump(state, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return state
+
+def run_forecast(df, n_estimators=100, retrain=False):
+    # Lag features come precomputed from the panel; day 0 has none
     df = df.dropna()
     
     if df.empty:
         print("Not enough historical data for lags.")
         return
-        
-    features = ['prev_mig_score', 'prev_demo', 'enrolment', 'biometric']
-    target = 'mig_score'
-    
-    X = df[features]
-    y = df[target]
-    
-    # Split
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-    
-    rmse = np.sqrt(mean_squared_error(y_test, model.predict(X_test)))
-    print(f"Model RMSE: {rmse:.4f}")
+    model = fit_forecaster(df, n_estimators=n_estimators, retrain=retrain)['model']
     
     recent = df.groupby(['state', 'district']).tail(1).copy()
     recent['prev_mig_score'] = recent['mig_score']
     recent['prev_demo'] = recent['demographic']
     
-    preds = model.predict(recent[features])
+    preds = model.predict(recent[FEATURES])
     recent['pred_score'] = preds
     recent['change'] = recent['pred_score'] - recent['mig_score']
     
     return recent
 
+def lag_design(series, lags=AR_LAGS):
+    """Design tensors for an AR(lags) fit on every row of a (series x day) array.
+
+    X[n, t] = [1, y[t-1], ..., y[t-lags]] and y[n, t] = series[n, t + lags].
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(series, lags + 1, axis=1)
+    y = windows[:, :, -1]
+    X = np.concatenate([np.ones(y.shape + (1,)), windows[:, :, -2::-1]], axis=2)
+    return X, y
+
+def fit_ar(series, lags=AR_LAGS, ridge=1.0):
+    """Ridge AR coefficients for each row, solved as one batch of normal equations."""
+    X, y = lag_design(series, lags)
+    penalty = ridge * np.eye(lags + 1)
+    penalty[0, 0] = 0  # don't shrink the intercept
+    XtX = np.einsum('nmk,nml->nkl', X, X) + penalty
+    Xty = np.einsum('nmk,nm->nk', X, y)
+    return np.linalg.solve(XtX, Xty[..., None])[..., 0]
+
+def fit_pooled_ar(series, lags=AR_LAGS, ridge=1.0):
+    """One ridge AR fit shared by all rows (a cluster), repeated per row."""
+    X, y = lag_design(series, lags)
+    penalty = ridge * np.eye(lags + 1)
+    penalty[0, 0] = 0
+    XtX = np.einsum('nmk,nml->kl', X, X) + penalty
+    Xty = np.einsum('nmk,nm->k', X, y)
+    return np.tile(np.linalg.solve(XtX, Xty), (len(series), 1))
+
+def fit_models(series, groups=None, lags=AR_LAGS, workers=WORKERS, min_batch=256):
+    """Fit per-row (groups=None) or per-group AR models across a process pool.
+
+    Rows are split into at most `workers` batches of at least min_batch rows,
+    since each batch is already a single vectorized solve.
+    """
+    if groups is None:
+        n_batches = max(1, min(workers, len(series) // min_batch))
+        batches = np.array_split(np.arange(len(series)), n_batches)
+        func = fit_ar
+    else:
+        batches = [np.flatnonzero(groups == g) for g in np.unique(groups)]
+        func = fit_pooled_ar
+    coef = np.empty((len(series), lags + 1))
+    if workers <= 1 or len(batches) <= 1:
+        for rows in batches:
+            coef[rows] = func(series[rows], lags)
+        return coef
+    with process_pool(min(workers, len(batches))) as pool:
+        for rows, c in zip(batches, pool.map(func, [series[rows] for rows in batches], [lags] * len(batches))):
+            coef[rows] = c
+    return coef
+
+def forecast_ar(series, coef, horizon):
+    """Recursive multi-step forecasts for every row at once: (series x horizon)."""
+    lags = coef.shape[1] - 1
+    window = series[:, -lags:][:, ::-1].copy()  # most recent first
+    out = np.empty((len(series), horizon))
+    for h in range(horizon):
+        out[:, h] = np.maximum(coef[:, 0] + np.einsum('nk,nk->n', coef[:, 1:], window), 0)
+        window = np.concatenate([out[:, h:h + 1], window[:, :-1]], axis=1)
+    return out
+
+def district_forecasts(panel=None, clusters=None, mode='district', horizons=HORIZONS,
+                       lags=AR_LAGS, workers=WORKERS):
+    """Migration-score forecasts for every district over each horizon.
+
+    mode='district' fits one lightweight AR model per district; mode='cluster'
+    pools the districts of each run_kmeans cluster into one model. Fits run
+    in parallel batches and scoring is a single vectorized pass. Each
+    forecast_<h>d column is the mean predicted daily score over the next h days.
+    """
+    if panel is None:
+        panel = build_panel()
+    demo, bio = panel.values['demographic'], panel.values['biometric']
+    series = demo / (bio + 1)
+    if series.shape[1] <= lags:
+        print("Not enough history for per-district forecasts.")
+        return pd.DataFrame()
+    
+    groups = None
+    if mode == 'cluster':
+        if clusters is None:
+            clusters = pd.read_csv(os.path.join(OUTPUT_DIR, "district_clusters.csv"), usecols=['state', 'district', 'cluster'])
+        labels = panel.districts.merge(clusters[['state', 'district', 'cluster']].astype({'state': str, 'district': str}),
+                                       on=['state', 'district'], how='left')
+        groups = labels['cluster'].fillna(-1).to_numpy()
+    
+    print(f"Fitting {mode}-level forecast models for {len(series)} districts...")
+    coef = fit_models(series, groups, lags, workers)
+    path = forecast_ar(series, coef, max(horizons))
+    
+    out = panel.districts.copy()
+    out['mig_score'] = series[:, -7:].mean(axis=1)
+    for h in horizons:
+        out[f'forecast_{h}d'] = path[:, :h].mean(axis=1)
+    output_file = os.path.join(OUTPUT_DIR, "district_forecasts.csv")
+    out.to_csv(output_file, index=False)
+    print(f"District forecasts saved to {output_file}")
+    return out
+
 def save_report(preds):
     top_risks = preds.sort_values('change', ascending=False).head(10)
     
-    report_path = os.path.join(OUTPUT_DIR, "prediction_report.md")
-    with open(report_path, "w") as f:
-        f.write("# Predictive Insights: Future Migration Hotspots\n\n")
-        f.write("> **Forecast**: Predicting Districts likely to see a SURGE in migration-related updates next month.\n\n")
-        
-        f.write("## Top 10 Districts with Predicted Increase in Migration Pressure\n")
-        f.write("| State | District | Current Score | Predicted Score | Predicted Increase |\n")
-        f.write("|---|---|---|---|---|\n")
-        
-        for _, row in top_risks.iterrows():
-            f.write(f"| {row['state']} | {row['district']} | {row['mig_score']:.2f} | {row['pred_score']:.2f} | +{row['change']:.2f} |\n")
+    report_path = write_report("prediction_report", [
+        "# Predictive Insights: Future Migration Hotspots\n\n",
+        "> **Forecast**: Predicting Districts likely to see a SURGE in migration-related updates next month.\n\n",
+        "## Top 10 Districts with Predicted Increase in Migration Pressure\n",
+        Table(top_risks, [('state', 'State', '%s'), ('district', 'District', '%s'), ('mig_score', 'Current Score', '%.2f'),
+                          ('pred_score', 'Predicted Score', '%.2f'), ('change', 'Predicted Increase', '+%.2f')]),
+    ])[0]
             
     print(f"Prediction report saved to {report_path}")
 
@@ -102,10 +290,13 @@ if __name__ == "__main__":
         import subprocess
         subprocess.check_call(["pip", "install", "scikit-learn"])
         
+    import sys
     df = get_training_data()
     if not df.empty:
-        preds = run_forecast(df)
+        preds = run_forecast(df, retrain='--retrain' in sys.argv)
         if preds is not None:
             save_report(preds)
+        if '--per-district' in sys.argv or '--per-cluster' in sys.argv:
+            district_forecasts(mode='cluster' if '--per-cluster' in sys.argv else 'district')
     else:
         print("Data loading failed or empty.")
@@ -1,7 +1,14 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import os
+import plotly.io as pio
+from dashboard_cube import ALL, load_cube, published_version, view, views
+import daily_store
+import charts
+import export
+import scenarios
+from ingest import load_manifest
+from artifact_cache import code_version, data_version
 
 # Page Config: Custom Title and Icon
 st.set_page_config(
@@ -24,71 +31,83 @@ st.title("UIDAI Analytics Dashboard")
 st.caption("Strategic Decision Support System | Predictive Analytics & Anomaly Detection")
 
 # Load Data
-@st.cache_data
-def load_data():
-    base_dir = "analysis_results"
-    
-    # 1. Cluster Data
-    cluster_path = os.path.join(base_dir, "district_clusters.csv")
-    if os.path.exists(cluster_path):
-        df = pd.read_csv(cluster_path)
-    else:
-        st.error("Cluster data not found. Please run analysis scripts.")
-        return pd.DataFrame(), pd.DataFrame()
-        
-    # 2. Predictions (I'll just mock/load if available or derive basic ones from the csv)
-    # Ideally load prediction_report or re-run, but I'll stick to the Cluster CSV which has 'migration_score'
-    
-    return df
+@st.cache_resource(max_entries=1)
+def load_data(version):
+    # One read-only, memory-mapped copy per server process, shared by every session.
+    # Keyed by the published version: a new pipeline run replaces it without a restart.
+    # Holds the district clusters plus the KPIs, segment metrics, leaderboards and
+    # anomaly flags precomputed per state by the pipeline.
+    return load_cube(version)
+
+@st.cache_data(max_entries=64)
+def load_daily(version, state, district, start, end):
+    # Reads only the month partitions / row groups of the selection
+    return daily_store.query_daily(start, end, state=None if state == ALL else state,
+                                   district=district, columns=TREND_COLUMNS, version=version)
+
+TREND_COLUMNS = ['total_enrol', 'total_bio', 'total_demo']
+
+# Figures are cached as JSON per filter state, so a rerun skips building them
+@st.cache_data(max_entries=64)
+def cluster_figure(version, state, _table):
+    return charts.scatter_chart(
+        _table.to_pandas(),
+        x="update_intensity",
+        y="migration_score",
+        size="total_enrol",
+        color="cluster",
+        hover_name="district",
+        log_x=True,
+        title="District Personas: Activity vs. Migration Pressure",
+        labels={"update_intensity": "Digital Intensity (Updates/User)", "migration_score": "Inward Migration Risk"},
+        height=500,
+        color_continuous_scale=px.colors.sequential.Viridis
+    ).to_json()
 
-df = load_data()
+@st.cache_data(max_entries=64)
+def trend_figure(version, state, district, start, end):
+    daily = load_daily(version, state, district, start, end)
+    series = daily.groupby('date')[TREND_COLUMNS].sum().reset_index()
+    return charts.line_chart(series, 'date', TREND_COLUMNS, height=400,
+                             title=f"Daily Activity: {district or state}",
+                             labels={"value": "Records", "date": "Date", "variable": "Category"}).to_json()
 
-if df.empty:
+cube_version = published_version()
+if cube_version is None:
+    st.error("Cluster data not found. Please run the pipeline (python pipeline.py).")
     st.stop()
+cube = load_data(cube_version)
 
 # Sidebar Filters
 st.sidebar.header("Filter Region")
-selected_state = st.sidebar.selectbox("Select State", ["All"] + sorted(df['state'].unique().tolist()))
+selected_state = st.sidebar.selectbox("Select State", [ALL] + views(cube))
 
-if selected_state != "All":
-    filtered_df = df[df['state'] == selected_state]
-else:
-    filtered_df = df
+# Zero-copy Arrow slices of the shared tables; converted only where a widget needs it
+filtered = view(cube, 'districts', selected_state)
+summary = view(cube, 'summary', selected_state).to_pylist()[0]
 
 # KPI Row
 col1, col2, col3, col4 = st.columns(4)
-col1.metric("Total Districts Covered", len(filtered_df))
+col1.metric("Total Districts Covered", int(summary['districts']))
 col1.info("Districts analyzed in this view")
 
-total_enrol = filtered_df['total_enrol'].sum()
+total_enrol = summary['total_enrol']
 col2.metric("Total New Enrolments", f"{total_enrol:,.0f}")
 col2.success("Fresh Aadhaar generations")
 
-avg_mig = filtered_df['migration_score'].mean()
+avg_mig = summary['avg_migration']
 col3.metric("Avg Migration Score", f"{avg_mig:.2f}")
 col3.warning("Ratio of Demo to Bio updates")
 
 # --- LAYOUT RESTRUCTURING ---
-tab1, tab2, tab3 = st.tabs(["Regional Segmentation", "Forecasting Model", "Operational Alerts"])
+tab1, tab2, tab3, tab4 = st.tabs(["Regional Segmentation", "Forecasting Model", "Operational Alerts", "Daily Trends"])
 
 with tab1:
     st.header("Regional Segmentation Analysis")
     st.markdown("Districts are categorized into 4 distinct segments based on enrolment volume and update frequency.")
     
     # Scatter Plot
-    fig_clusters = px.scatter(
-        filtered_df,
-        x="update_intensity",
-        y="migration_score",
-        size="total_enrol",
-        color="cluster",
-        hover_name="district",
-        log_x=True,
-        title="District Personas: Activity vs. Migration Pressure",
-        labels={"update_intensity": "Digital Intensity (Updates/User)", "migration_score": "Inward Migration Risk"},
-        height=500,
-        color_continuous_scale=px.colors.sequential.Viridis
-    )
+    fig_clusters = pio.from_json(cluster_figure(cube_version, selected_state, filtered))
     st.plotly_chart(fig_clusters, use_container_width=True)
     
     # Cluster Descriptions
@@ -107,16 +126,16 @@ with tab2:
     
     with col_pred:
         # Top Risk Districts
-        top_mig = filtered_df.sort_values("migration_score", ascending=False).head(15)
+        top_mig = view(cube, 'top_migration', selected_state)
         st.dataframe(
-            top_mig[['state', 'district', 'migration_score', 'total_updates']],
+            top_mig.select(['state', 'district', 'migration_score', 'total_updates']),
             column_config={
                 "migration_score": st.column_config.ProgressColumn(
                     "Risk Index",
                     help="Calculated ratio of Demographic to Biometric updates.",
                     format="%.2f",
                     min_value=0,
-                    max_value=max(df['migration_score']),
+                    max_value=view(cube, 'summary', ALL)['max_migration'][0].as_py(),
                 ),
                 "total_updates": st.column_config.NumberColumn("Proj. Volume", format="%d")
             },
@@ -127,12 +146,10 @@ with tab2:
     with col_anom:
         st.subheader("Anomaly Detection")
         st.caption("Statistical outliers detected by Isolation Forest.")
-        # Re-run quick anomaly check for display (Mock logic mirroring script)
-        # Ratio > 10 is usually weird
-        anomalies = filtered_df[filtered_df['migration_score'] > 5.0]
-        if not anomalies.empty:
-            st.error(f"{len(anomalies)} Districts flagged for Audit.")
-            st.dataframe(anomalies[['district', 'migration_score']], hide_index=True)
+        anomalies = view(cube, 'anomalies', selected_state)
+        if anomalies.num_rows:
+            st.error(f"{anomalies.num_rows} Districts flagged for Audit.")
+            st.dataframe(anomalies.select(['district', 'bio_ratio', 'anomaly_score']), hide_index=True)
         else:
             st.success("No statistical anomalies found in current view.")
 
@@ -145,15 +162,14 @@ with tab3:
         st.subheader("Automated Recommendations")
         # Logic reused but presented better
         rec_count = 0
-        high_mig = len(filtered_df[filtered_df['migration_score'] > 2.0])
+        high_mig = int(summary['high_migration'])
         if high_mig > 0:
             st.warning(f"**Migration Surge**: {high_mig} districts need immediate resource augmentation.")
             rec_count +=1
             
-        if 'enrol_0_5' in filtered_df.columns:
-             if filtered_df['enrol_5_17'].sum() > (filtered_df['enrol_0_5'].sum() * 1.5):
-                st.info("**Child Coverage**: Initiate 'Anganwadi' enrolment drive in rural clusters.")
-                rec_count += 1
+        if summary['enrol_5_17'] > summary['enrol_0_5'] * 1.5:
+            st.info("**Child Coverage**: Initiate 'Anganwadi' enrolment drive in rural clusters.")
+            rec_count += 1
         
         if rec_count == 0:
             st.success("Operations within normal parameters.")
@@ -164,25 +180,87 @@ with tab3:
         
         camp_boost = st.slider("Enrolment Camp Increase (%)", 0, 50, 10)
         staff_boost = st.slider("Staff Augmentation (%)", 0, 30, 5)
+        engine_version = scenarios.inputs_version()
+        if engine_version is None:
+            st.info("Forecast model not trained yet. Run `python pipeline.py scenario_inputs`.")
+        else:
+            targets = st.multiselect("Target Districts (default: all in view)", sorted(filtered['district'].to_pylist()),
+                                     disabled=selected_state == ALL,
+                                     help="Pick a state in the sidebar to target individual districts.")
+            # Memoized per (filter, slider values) and shared by every session
+            plan = scenarios.evaluate(engine_version, None if selected_state == ALL else selected_state,
+                                      tuple(sorted(targets)), camp_boost, staff_boost)
+            new_cap = plan['projected_enrol'].sum()
+            st.metric("Projected Capacity", f"{new_cap:,.0f} enrolments",
+                      delta=f"{plan['extra_enrol'].sum():,.0f} from camps and staff")
+            mig_change = plan['mig_score_change'].mean()
+            if pd.notna(mig_change):
+                st.metric("Forecast Migration Score", f"{plan['scenario_mig_score'].mean():.2f}",
+                          delta=f"{mig_change:+.3f}", delta_color="inverse")
+            
+            st.download_button(
+                "Generate Resource Plan",
+                lambda: plan.to_csv(index=False),
+                f"resource_plan_{selected_state.replace(' ', '_')}_camp{camp_boost}_staff{staff_boost}.csv",
+                "text/csv",
+                key='download-plan'
+            )
+
+with tab4:
+    st.header("Daily Activity Trends")
+    try:
+        version = daily_store.current_version()
+        index = daily_store.district_index(version)
+    except OSError:
+        st.info("Daily store not built yet. Run `python pipeline.py daily_store`.")
+    else:
+        if selected_state != ALL:
+            index = index[index['state'] == selected_state]
+        c_range, c_district = st.columns(2)
+        first, last = index['first_day'].min().date(), index['last_day'].max().date()
+        picked = c_range.date_input("Date Range", (first, last), min_value=first, max_value=last)
+        start, end = (picked[0], picked[-1]) if isinstance(picked, (tuple, list)) else (picked, picked)
+        options = sorted(index['district'].unique()) if selected_state != ALL else []
+        district = c_district.selectbox("Drill down to District", ["All Districts"] + options,
+                                        disabled=selected_state == ALL,
+                                        help="Pick a state in the sidebar to drill into its districts.")
+        district = None if district == "All Districts" else district
         
-        new_cap = total_enrol * (1 + (camp_boost/100))
-        st.metric("Projected Capacity", f"{new_cap:,.0f} enrolments", delta=f"{camp_boost}% surge capacity")
-        
-        if st.button("Generate Resource Plan"):
-             st.success("Resource plan generated and sent to Regional Office.")
+        daily = load_daily(version, selected_state, district, start, end)
+        if daily.empty:
+            st.info("No activity recorded in the selected range.")
+        else:
+            fig_trend = pio.from_json(trend_figure(version, selected_state, district, start, end))
+            st.plotly_chart(fig_trend, use_container_width=True)
+            if district is None:
+                st.markdown("#### District Totals for the Period")
+                totals = daily.groupby(['state', 'district'])[TREND_COLUMNS].sum()
+                st.dataframe(totals.sort_values('total_enrol', ascending=False).reset_index(),
+                             use_container_width=True, hide_index=True)
 
 # --- FOOTER ---
 st.markdown("---")
 col_d, col_info = st.columns([1, 4])
 with col_d:
-    # CSV Download
-    csv = filtered_df.to_csv(index=False).encode('utf-8')
+    # Export is written on click, in chunks, and shared across sessions per (filter, data version).
+    # Streamlit still holds the finished file in memory to serve it.
+    level = st.selectbox("Export", ["District summary", "Raw records"], label_visibility="collapsed")
+    fmt = st.selectbox("Format", list(export.FORMATS), label_visibility="collapsed")
+    state = None if selected_state == ALL else selected_state
+    if level == "Raw records":
+        # Keyed on the ingested data itself (the cache can be newer than the pipeline
+        # outputs) and on the export layout
+        name = ('raw', state, fmt, data_version(load_manifest()), code_version([export]))
+        chunks = lambda: export.raw_chunks(state)
+    else:
+        name = ('summary', state, fmt, cube_version)
+        chunks = lambda: export.frame_chunks(filtered.to_pandas())
     st.download_button(
         "Download Report",
-        csv,
-        "uidai_analytics_report.csv",
-        "text/csv",
-        key='download-csv'
+        lambda: export.export_bytes(name, chunks, fmt),
+        f"uidai_{'raw' if level == 'Raw records' else 'report'}_{(state or 'all').replace(' ', '_')}.{fmt}",
+        export.FORMATS[fmt],
+        key='download-report'
     )
 with col_info:
     st.caption("Confidential | For Official Use Only | Generated by UIDAI Analytics Dashboard v1.2")
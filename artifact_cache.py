@@ -0,0 +1,73 @@
+import os
+import json
+import glob
+import pickle
+import inspect
+import hashlib
+from ingest import CACHE_DIR, OUTPUT_DIR
+
+# Configuration
+ARTIFACT_DIR = os.path.join(CACHE_DIR, "artifacts")
+KEEP_VERSIONS = 5
+
+def stable_hash(*parts):
+    """Short SHA-1 over JSON-serialisable parts (params, upstream keys, ...)."""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+def code_version(modules):
+    """Hash of the source of the modules that define a stage's behaviour."""
+    h = hashlib.sha1()
+    for module in modules:
+        h.update(inspect.getsource(module).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+def data_version(manifest):
+    """Version of the ingested data: the content hashes of all shards and the validation rules."""
+    return stable_hash(sorted((os.path.basename(f), e['sha1'], e.get('validation')) for f, e in manifest.items()))
+
+def artifact_path(stage, key, artifact_dir=ARTIFACT_DIR):
+    return os.path.join(artifact_dir, stage, f"{key}.pkl")
+
+def load_artifact(stage, key, artifact_dir=ARTIFACT_DIR, output_dir=OUTPUT_DIR):
+    """Return (True, result) for a cached stage and restore its report files."""
+    path = artifact_path(stage, key, artifact_dir)
+    if not os.path.exists(path):
+        return False, None
+    with open(path, 'rb') as f:
+        artifact = pickle.load(f)
+    # Another parameter set may have overwritten the shared output files since
+    for name, content in artifact['files'].items():
+        restore_file(os.path.join(output_dir, name), content)
+    os.utime(path)
+    return True, artifact['result']
+
+def restore_file(path, content):
+    if os.path.exists(path) and os.path.getsize(path) == len(content):
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def save_artifact(stage, key, result, outputs=(), artifact_dir=ARTIFACT_DIR, output_dir=OUTPUT_DIR):
+    """Store a stage's result and the report files it wrote under its key."""
+    files = {}
+    for name in outputs:
+        out = os.path.join(output_dir, name)
+        if os.path.exists(out):
+            with open(out, 'rb') as f:
+                files[name] = f.read()
+    path = artifact_path(stage, key, artifact_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'result': result, 'files': files}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    prune(stage, artifact_dir)
+
+def prune(stage, artifact_dir=ARTIFACT_DIR, keep=KEEP_VERSIONS):
+    """Keep only the most recently written versions of a stage."""
+    versions = sorted(glob.glob(os.path.join(artifact_dir, stage, "*.pkl")), key=os.path.getmtime)
+    for path in versions[:-keep]:
+        os.remove(path)
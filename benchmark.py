@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+# Configuration
+BENCH_DIR = os.path.join(tempfile.gettempdir(), "uidai_bench")
+# Imported modules create their output folder on import: keep it out of the real data folder
+os.environ.setdefault("UIDAI_BASE_DIR", BENCH_DIR)
+
+from ingest import CATEGORIES, COUNT_COLUMNS, DATE_FORMAT, WORKERS, process_pool
+from validation import STATES, PINCODE_RANGE
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+RESULTS_NAME = "benchmark_results.json"
+MARKER_NAME = "synthetic.json"
+GENERATOR_VERSION = 1
+SEED = 42
+# Rows per category at scale 1x: the size of the full public release
+BASE_ROWS = {'enrolment': 1_006_029, 'demographic': 2_071_700, 'biometric': 1_861_108}
+SHARD_ROWS = 500_000
+START_DATE, DAYS = pd.Timestamp('2025-03-01'), 306
+DISTRICTS, PINCODES_PER_DISTRICT = 780, 24
+# Mean count per row, by column (the heavy tail comes from the pincode intensity)
+COUNT_MEANS = {
+    'age_0_5': 3.6, 'age_5_17': 3.5, 'age_18_greater': 0.1,
+    'bio_age_5_17': 6.0, 'bio_age_17_': 14.0,
+    'demo_age_5_17': 1.3, 'demo_age_17_': 12.4,
+}
+# Share of rows whose state is spelled like the raw feed's variants ("WESTBENGAL")
+VARIANT_SHARE = 0.002
+DISTRICT_SKEW = 1.0        # sigma of the lognormal district activity weights
+PINCODE_SKEW = 0.8
+QUERIES, DAILY_QUERIES = 200, 50
+# A stage regresses when it is this much slower (or larger) than the baseline
+TIME_TOLERANCE = 0.20
+RSS_TOLERANCE = 0.20
+MIN_SECONDS = 1.0          # smaller slowdowns are within run-to-run noise
+
+def geography(seed=SEED):
+    """Synthetic districts and pincodes with skewed (lognormal) activity weights.
+
+    Districts are spread over the canonical states unevenly, as in the real
+    data; every district owns a block of consecutive PIN codes.
+    """
+    rng = np.random.default_rng(seed)
+    state_weights = rng.lognormal(0, 1.0, len(STATES))
+    per_state = np.maximum(1, np.round(state_weights / state_weights.sum() * DISTRICTS)).astype(int)
+    states = np.repeat(STATES, per_state)
+    districts = pd.DataFrame({
+        'state': states,
+        'district': [f"{s.split()[0]} District {i + 1}" for s, n in zip(STATES, per_state) for i in range(n)],
+        'weight': rng.lognormal(0, DISTRICT_SKEW, len(states)),
+    })
+    counts = rng.poisson(PINCODES_PER_DISTRICT, len(districts)) + 1
+    pins = districts.loc[districts.index.repeat(counts)].reset_index(drop=True)
+    pins['pincode'] = PINCODE_RANGE[0] + np.arange(len(pins)) * ((PINCODE_RANGE[1] - PINCODE_RANGE[0]) // len(pins))
+    pins['weight'] *= rng.lognormal(0, PINCODE_SKEW, len(pins))
+    pins['weight'] /= pins['weight'].sum()
+    return pins
+
+def shard_plan(scale):
+    """(category, shard number, rows, first day, day count, first row, end row) of every shard.
+
+    Each shard covers its own run of days, so shards never share
+    (date, pincode) keys and nothing is superseded during ingest.
+    """
+    plan = []
+    for cat in CATEGORIES:
+        total = max(1, int(BASE_ROWS[cat] * scale))
+        shards = min(DAYS, -(-total // SHARD_ROWS))
+        day_edges = np.linspace(0, DAYS, shards + 1).astype(int)
+        row_edges = np.linspace(0, total, shards + 1).astype(int)
+        for i in range(shards):
+            plan.append((cat, i, row_edges[i + 1] - row_edges[i], day_edges[i], day_edges[i + 1] - day_edges[i],
+                         row_edges[i], row_edges[i + 1]))
+    return plan
+
+def write_shard(data_dir, pins, cat, number, rows, first_day, days, start, end, seed=SEED):
+    """Write one raw CSV shard in the real feed's layout and file naming."""
+    rng = np.random.default_rng([seed, CATEGORIES.index(cat), number])
+    picked = pins.iloc[rng.choice(len(pins), size=rows, p=pins['weight'].to_numpy())]
+    dates = START_DATE + pd.to_timedelta(first_day + np.sort(rng.integers(0, days, rows)), unit='D')
+    df = pd.DataFrame({'date': dates.strftime(DATE_FORMAT), 'state': picked['state'].to_numpy(),
+                       'district': picked['district'].to_numpy(), 'pincode': picked['pincode'].to_numpy()})
+    intensity = rng.lognormal(-0.245, 0.7, rows)   # mean 1
+    for col in COUNT_COLUMNS[cat]:
+        df[col] = rng.poisson(COUNT_MEANS[col] * intensity)
+    variant = rng.random(rows) < VARIANT_SHARE
+    df.loc[variant, 'state'] = df.loc[variant, 'state'].str.upper().str.replace(' ', '', regex=False)
+
+    folder = os.path.join(data_dir, f"api_data_aadhar_{cat}", f"api_data_aadhar_{cat}")
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"api_data_aadhar_{cat}_{start}_{end}.csv")
+    df.to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return path
+
+def generate(scale, data_dir, seed=SEED, workers=WORKERS):
+    """Synthetic raw shards for a scale factor, reused while the parameters match."""
+    marker = {'scale': scale, 'seed': seed, 'version': GENERATOR_VERSION, 'base_rows': BASE_ROWS}
+    marker_path = os.path.join(data_dir, MARKER_NAME)
+    if os.path.exists(marker_path):
+        with open(marker_path) as f:
+            if json.load(f) == marker:
+                print(f"Reusing synthetic data in {data_dir}")
+                return
+        reset(data_dir)
+    elif os.path.exists(data_dir) and os.listdir(data_dir):
+        raise ValueError(f"{data_dir} is not a synthetic data folder; refusing to write into it")
+
+    plan = shard_plan(scale)
+    print(f"Generating {sum(p[2] for p in plan):,} rows in {len(plan)} shard(s) at {scale:g}x...")
+    pins = geography(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    with process_pool(max(1, min(workers, len(plan)))) as pool:
+        for future in [pool.submit(write_shard, data_dir, pins, *p, seed=seed) for p in plan]:
+            future.result()
+    with open(marker_path, "w") as f:
+        json.dump(marker, f)
+
+def reset(data_dir, keep_raw=False):
+    """Remove what earlier runs (and, unless keep_raw, the generator) wrote to a synthetic folder."""
+    if not os.path.exists(os.path.join(data_dir, MARKER_NAME)):
+        raise ValueError(f"{data_dir} is not a synthetic data folder")
+    for name in os.listdir(data_dir):
+        if keep_raw and (name.startswith("api_data_aadhar_") or name == MARKER_NAME):
+            continue
+        path = os.path.join(data_dir, name)
+        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+def run_stages():
+    """Time every stage on a cold cache; runs in a process whose UIDAI_BASE_DIR is the synthetic folder."""
+    from ingest import update_cache
+    from feature_store import build_features, get_features, get_rankings, top_k
+    from daily_store import build_daily_store, district_index, query_daily
+    from analyze_clustering import run_kmeans
+    from analyze_anomalies import find_outliers
+    from analyze_predictions import get_training_data, run_forecast
+    from dashboard_cube import build_cube, load_cube, views, view
+    from pipeline import MemorySampler
+
+    sampler = MemorySampler()
+    sampler.start()
+    stages = {}
+    def timed(name, func, items=None):
+        sampler.start_stage(name)
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        count = items(result) if items else None
+        peak = sampler.end_stage(name)
+        stages[name] = {'seconds': round(seconds, 3), 'peak_rss_mb': round(peak, 1) if peak else None,
+                        'items': count, 'throughput': round(count / seconds, 1) if count and seconds else None}
+        print(f"[{name}] {seconds:.2f}s")
+        return result
+
+    # 1. Load: parse, validate and partition every shard
+    manifest = timed('load', lambda: update_cache(rebuild=True),
+                     lambda m: sum(e['rows'] + e['quarantined'] for e in m.values()))
+    rows = stages['load']['items']
+    # 2. Aggregate: district features (+ rankings) and the daily store
+    def aggregate():
+        build_daily_store(manifest)
+        return get_features(version=build_features(manifest))
+    features = timed('aggregate', aggregate, lambda _: rows)
+    clusters = timed('cluster', lambda: run_kmeans(features, n_clusters=4), len)
+    anomalies = timed('anomaly', lambda: find_outliers(features), len)
+    timed('forecast', lambda: run_forecast(get_training_data(), retrain=True),
+          lambda preds: 0 if preds is None else len(preds))
+    timed('dashboard', lambda: build_cube(clusters, anomalies, features), lambda _: len(features))
+
+    # 3. Dashboard queries: cube views, leaderboards and daily trend reads, as the app issues them
+    cube, rankings = load_cube(), get_rankings(features.attrs['feature_version'])
+    rng = np.random.default_rng(SEED)
+    states = views(cube, 'summary')
+    index = district_index()
+    latency = []
+    def queries():
+        for state in rng.choice(states, QUERIES):
+            start = time.perf_counter()
+            for name in ['summary', 'cube', 'top_migration', 'anomalies', 'districts']:
+                view(cube, name, state)
+            top_k(rankings, 'migration_score', 15, state)
+            latency.append(time.perf_counter() - start)
+        for i in rng.choice(len(index), DAILY_QUERIES):
+            day = START_DATE + pd.Timedelta(days=int(rng.integers(0, DAYS - 90)))
+            start = time.perf_counter()
+            query_daily(day, day + pd.Timedelta(days=90), index['state'].iloc[i], index['district'].iloc[i])
+            latency.append(time.perf_counter() - start)
+        return len(latency)
+    timed('queries', queries, lambda n: n)
+    stages['queries'].update(p50_ms=round(np.percentile(latency, 50) * 1000, 2),
+                             p95_ms=round(np.percentile(latency, 95) * 1000, 2))
+    sampler.stopped.set()
+    return {'rows': rows, 'stages': stages}
+
+def run_scale(scale, data_dir, repeat=1):
+    """Benchmark one scale in fresh processes; keeps each stage's fastest run."""
+    generate(scale, data_dir)
+    best = None
+    for i in range(repeat):
+        reset(data_dir, keep_raw=True)
+        out = os.path.join(data_dir, RESULTS_NAME)
+        log = os.path.join(data_dir, "benchmark.log")
+        env = dict(os.environ, UIDAI_BASE_DIR=data_dir)
+        print(f"Run {i + 1}/{repeat} at {scale:g}x (log: {log})")
+        with open(log, "w") as f:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", out],
+                           env=env, stdout=f, stderr=subprocess.STDOUT, check=True)
+        with open(out) as f:
+            result = json.load(f)
+        if best is None:
+            best = result
+        else:
+            for name, stage in result['stages'].items():
+                if stage['seconds'] < best['stages'][name]['seconds']:
+                    best['stages'][name] = stage
+    return best
+
+def machine():
+    return {'python': platform.python_version(), 'pandas': pd.__version__, 'cpus': os.cpu_count(),
+            'platform': platform.platform()}
+
+def compare(result, baseline):
+    """Stages slower or larger than the baseline beyond the tolerances, as messages."""
+    regressions = []
+    for name, stage in result['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None:
+            continue
+        if stage['seconds'] > max(base['seconds'] * (1 + TIME_TOLERANCE), base['seconds'] + MIN_SECONDS):
+            regressions.append(f"{name}: {base['seconds']:.2f}s -> {stage['seconds']:.2f}s")
+        base_rss, rss = base['peak_rss_mb'], stage['peak_rss_mb']
+        if base_rss and rss and rss > base_rss * (1 + RSS_TOLERANCE):
+            regressions.append(f"{name}: peak RSS {base_rss:.0f} MB -> {rss:.0f} MB")
+    return regressions
+
+def print_result(scale, result, baseline=None):
+    print(f"\nScale {scale:g}x: {result['rows']:,} input rows")
+    print(f"{'Stage':<12}{'Time (s)':>10}{'Baseline':>10}{'Items/s':>14}{'Peak RSS (MB)':>16}")
+    for name, stage in result['stages'].items():
+        base = (baseline or {}).get('stages', {}).get(name)
+        base = f"{base['seconds']:.2f}" if base else "-"
+        rate = f"{stage['throughput']:,.0f}" if stage['throughput'] else "-"
+        rss = f"{stage['peak_rss_mb']:.0f}" if stage['peak_rss_mb'] is not None else "-"
+        print(f"{name:<12}{stage['seconds']:>10.2f}{base:>10}{rate:>14}{rss:>16}")
+    queries = result['stages'].get('queries', {})
+    if 'p50_ms' in queries:
+        print(f"Query latency: p50 {queries['p50_ms']} ms, p95 {queries['p95_ms']} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic data.")
+    parser.add_argument('--scale', type=float, nargs='+', default=[1.0],
+                        help="scale factors relative to the full public release (e.g. 1 10 100; 0.01 for a smoke run)")
+    parser.add_argument('--data-dir', default=BENCH_DIR, help="where synthetic data is generated (one folder per scale)")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per scale; the fastest run of each stage counts")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.worker, "w") as f:
+            json.dump(run_stages(), f, indent=1)
+        return
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    if baselines and baselines.get('machine') != machine():
+        print("[WARNING]: Baseline was recorded on a different machine or library versions.")
+
+    regressions = []
+    for scale in args.scale:
+        key = f"{scale:g}x"
+        result = run_scale(scale, os.path.join(args.data_dir, f"scale_{key}"), args.repeat)
+        baseline = baselines.get('scales', {}).get(key)
+        print_result(scale, result, baseline)
+        if baseline and not args.save_baseline:
+            regressions += [f"{key} {r}" for r in compare(result, baseline)]
+        if args.save_baseline:
+            baselines.setdefault('scales', {})[key] = result
+
+    if args.save_baseline:
+        baselines['machine'] = machine()
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=1)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif regressions:
+        print("\n[RESULT]: PERFORMANCE REGRESSION")
+        for r in regressions:
+            print(f"  {r}")
+        sys.exit(1)
+    else:
+        print("\n[RESULT]: NO REGRESSIONS" if baselines else "\n[RESULT]: NO BASELINE (use --save-baseline)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+# Configuration
+MAX_LINE_POINTS = 1_000     # per series; LTTB keeps the visual shape
+WEBGL_POINTS = 5_000        # above this, scatters are drawn with scattergl
+MAX_SCATTER_POINTS = 100_000
+
+def lttb(x, y, threshold):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    x must be increasing. The first and last points are always kept; every
+    bucket in between keeps the point forming the largest triangle with the
+    previously kept point and the mean of the next bucket.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[prev] - avg_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (avg_y - y[prev]))
+        prev = lo + int(area.argmax())
+        keep[i + 1] = prev
+    return keep
+
+def downsample(df, x, ys, max_points=MAX_LINE_POINTS):
+    """Long (x, variable, value) frame with each series reduced to at most max_points."""
+    df = df.sort_values(x)
+    xs = df[x].to_numpy()
+    numeric_x = xs.astype('datetime64[ns]').astype('int64') if np.issubdtype(xs.dtype, np.datetime64) else xs
+    parts = []
+    for col in ys:
+        keep = lttb(numeric_x, df[col].to_numpy(), max_points)
+        parts.append(pd.DataFrame({x: xs[keep], 'variable': col, 'value': df[col].to_numpy()[keep]}))
+    return pd.concat(parts, ignore_index=True)
+
+def line_chart(df, x, ys, max_points=MAX_LINE_POINTS, **kwargs):
+    """px.line over the LTTB-downsampled series."""
+    return px.line(downsample(df, x, ys, max_points), x=x, y='value', color='variable', **kwargs)
+
+def scatter_chart(df, color=None, max_points=MAX_SCATTER_POINTS, **kwargs):
+    """px.scatter that switches to WebGL for large frames.
+
+    Beyond max_points, a sample is drawn per color group so small segments
+    stay visible.
+    """
+    if len(df) > max_points:
+        share = max_points / len(df)
+        groups = df.groupby(color, observed=True) if color else [(None, df)]
+        df = pd.concat([g.sample(n=max(1, int(len(g) * share)), random_state=42) for _, g in groups])
+    render_mode = 'webgl' if len(df) > WEBGL_POINTS else 'svg'
+    return px.scatter(df, color=color, render_mode=render_mode, **kwargs)
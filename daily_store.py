@@ -0,0 +1,109 @@
+import os
+import glob
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from ingest import CACHE_DIR, AGGREGATE_KEYS, DISTRICT_COLUMNS, update_cache, load_aggregates
+from artifact_cache import data_version
+
+# Configuration
+DAILY_DIR = os.path.join(CACHE_DIR, "daily")
+CURRENT_NAME = "CURRENT"
+INDEX_NAME = "districts.parquet"
+# Small row groups: each one covers a few districts of a month, so (state,
+# district) filters skip most of a partition using the row-group statistics
+ROW_GROUP_ROWS = 16_384
+TOTALS = {
+    'total_enrol': ['enrol_0_5', 'enrol_5_17', 'enrol_18_plus'],
+    'total_bio': ['bio_update_child', 'bio_update_adult'],
+    'total_demo': ['demo_update_child', 'demo_update_adult'],
+}
+
+def daily_table(aggs):
+    """One row per (state, district, date) with every count column and the totals."""
+    frames = [agg.set_index(AGGREGATE_KEYS).drop(columns='records').rename(columns=DISTRICT_COLUMNS)
+              for agg in aggs.values()]
+    df = pd.concat(frames, axis=1).reindex(columns=list(DISTRICT_COLUMNS.values())).fillna(0).astype('int64')
+    for total, cols in TOTALS.items():
+        df[total] = df[cols].sum(axis=1)
+    df = df.reset_index().dropna(subset=['date'])
+    # Plain strings so filters and statistics don't depend on the dictionary encoding
+    df[['state', 'district']] = df[['state', 'district']].astype(str)
+    df['month'] = df['date'].dt.strftime('%Y-%m')
+    return df.sort_values(['month', 'state', 'district', 'date'], ignore_index=True)
+
+def store_path(version, daily_dir=DAILY_DIR):
+    return os.path.join(daily_dir, version)
+
+def build_daily_store(manifest=None, daily_dir=DAILY_DIR):
+    """Write the per-district daily series for the current data version, once.
+
+    The store is partitioned by month (hive layout, month=YYYY-MM) and sorted
+    by (state, district, date) inside each partition; a small index lists
+    every district with its first and last active day.
+    """
+    if manifest is None:
+        manifest = update_cache()
+    version = data_version(manifest)
+    path = store_path(version, daily_dir)
+    if not os.path.exists(path):
+        print("Building daily district store...")
+        df = daily_table(load_aggregates())
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        ds.write_dataset(pa.Table.from_pandas(df, preserve_index=False), tmp_path, format='parquet',
+                         partitioning=ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive'),
+                         max_rows_per_group=ROW_GROUP_ROWS, min_rows_per_group=ROW_GROUP_ROWS // 4)
+        index = df.groupby(['state', 'district']).agg(first_day=('date', 'min'), last_day=('date', 'max'))
+        index.reset_index().to_parquet(os.path.join(tmp_path, INDEX_NAME), index=False)
+        os.replace(tmp_path, path)
+        for old in glob.glob(os.path.join(daily_dir, "*", "")):
+            if os.path.basename(os.path.dirname(old)) != version:
+                shutil.rmtree(old, ignore_errors=True)
+    # Also when the store exists: the data may have gone back to this version
+    if not os.path.exists(os.path.join(daily_dir, CURRENT_NAME)) or current_version(daily_dir) != version:
+        with open(os.path.join(daily_dir, CURRENT_NAME), "w") as f:
+            f.write(version)
+    return version
+
+def current_version(daily_dir=DAILY_DIR):
+    """Version last built by the pipeline, without touching the raw data."""
+    with open(os.path.join(daily_dir, CURRENT_NAME)) as f:
+        return f.read().strip()
+
+def district_index(version=None, daily_dir=DAILY_DIR):
+    """(state, district, first_day, last_day) for every district in the store."""
+    version = version or current_version(daily_dir)
+    return pd.read_parquet(os.path.join(store_path(version, daily_dir), INDEX_NAME))
+
+def query_daily(start=None, end=None, state=None, district=None, columns=None, version=None, daily_dir=DAILY_DIR):
+    """Daily rows between start and end (inclusive) for a state and/or district.
+
+    Month partitions outside the range are never opened and the remaining
+    row groups are pruned by their date/state/district statistics.
+    """
+    version = version or current_version(daily_dir)
+    dataset = ds.dataset(store_path(version, daily_dir), format='parquet', partitioning='hive',
+                         exclude_invalid_files=True, ignore_prefixes=[INDEX_NAME])
+    conditions = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions += [ds.field('month') >= start.strftime('%Y-%m'), ds.field('date') >= start]
+    if end is not None:
+        end = pd.Timestamp(end)
+        conditions += [ds.field('month') <= end.strftime('%Y-%m'), ds.field('date') <= end]
+    if state is not None:
+        conditions.append(ds.field('state') == state)
+    if district is not None:
+        conditions.append(ds.field('district') == district)
+    expr = None
+    for condition in conditions:
+        expr = condition if expr is None else expr & condition
+    if columns is not None:
+        columns = ['state', 'district', 'date'] + [c for c in columns if c not in ('state', 'district', 'date')]
+    df = dataset.to_table(columns=columns, filter=expr).to_pandas()
+    return df.drop(columns='month', errors='ignore').sort_values(['state', 'district', 'date'], ignore_index=True)
+
+if __name__ == "__main__":
+    print(f"Daily store at version {build_daily_store()}")
@@ -0,0 +1,173 @@
+import os
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from ingest import OUTPUT_DIR
+from feature_store import ALL_STATES, rankings_for
+from artifact_cache import KEEP_VERSIONS
+
+# Configuration
+ALL = ALL_STATES
+TOP_N = 15
+HIGH_MIGRATION = 2.0
+# Uncompressed Arrow IPC (Feather v2) so that readers can memory-map them. Files are
+# named by content version and never overwritten: Windows can't replace a mapped file.
+CUBE_TABLES = ['districts', 'summary', 'cube', 'top_migration', 'anomalies']
+# Written last: names the version of the published cube
+PUBLISHED_NAME = "dashboard_version.txt"
+KEEP_CUBES = KEEP_VERSIONS
+
+def cube_path(name, version, output_dir=OUTPUT_DIR):
+    return os.path.join(output_dir, f"dashboard_{name}-{version}.arrow")
+
+def with_all(df, keys, agg):
+    """agg over groups of (state, *keys) and over all states, keyed by a 'view' column."""
+    parts = [agg(d.groupby(['state'] + keys, observed=True)) for d in (df.assign(state=ALL), df)]
+    return pd.concat(parts).reset_index().rename(columns={'state': 'view'})
+
+def summarize(groups):
+    """KPIs shown at the top of the dashboard and used by the recommendations."""
+    return groups.agg(districts=('district', 'size'),
+                      total_enrol=('total_enrol', 'sum'),
+                      total_updates=('total_updates', 'sum'),
+                      enrol_0_5=('enrol_0_5', 'sum'),
+                      enrol_5_17=('enrol_5_17', 'sum'),
+                      avg_migration=('migration_score', 'mean'),
+                      max_migration=('migration_score', 'max'),
+                      high_migration=('migration_score', lambda s: int((s > HIGH_MIGRATION).sum())))
+
+def cluster_metrics(groups):
+    return groups.agg(districts=('district', 'size'),
+                      total_enrol=('total_enrol', 'sum'),
+                      total_updates=('total_updates', 'sum'),
+                      migration_score=('migration_score', 'mean'),
+                      update_intensity=('update_intensity', 'mean'),
+                      child_share=('child_share', 'mean'))
+
+def build_cube(clusters, anomalies=None, features=None, top_n=TOP_N, output_dir=OUTPUT_DIR):
+    """Precompute every dashboard view, per state and for "All" states.
+
+    clusters is the district_clusters table, anomalies the find_outliers
+    output and features the district feature table (its ranking index
+    supplies the top-N lists; without it they are ranked from clusters).
+    Writes one Arrow file per table (see cube_path), each sorted by a
+    'view' column (state name or "All") so that a view is a contiguous
+    slice; the dashboard filters by lookup instead of recomputing on every
+    rerun. The districts table has no "All" rows: that view is the whole table.
+    """
+    print("Building dashboard cube...")
+    df = clusters.copy()
+    df['state'] = df['state'].astype(str)
+
+    tables = {'districts': df.assign(view=df['state'])}
+    # 1. KPIs per view and state x cluster x metric
+    tables['summary'] = with_all(df, [], summarize)
+    tables['cube'] = with_all(df, ['cluster'], cluster_metrics)
+
+    # 2. Top-N migration lists, read off the ranking index
+    ranked = features if features is not None else df.set_index(['state', 'district'])
+    rankings, _ = rankings_for(ranked)
+    top = rankings[(rankings['metric'] == 'migration_score') & (rankings['rank'] <= top_n)]
+    columns = ['state', 'district', 'migration_score', 'total_updates']
+    tables['top_migration'] = (ranked.iloc[top['row'].to_numpy()].reset_index()[columns]
+                               .astype({'state': str}).assign(view=top['view'].to_numpy()))
+
+    # 3. Isolation Forest flags
+    if anomalies is not None:
+        flagged = anomalies[anomalies['anomaly'] == -1].sort_values('anomaly_score')
+        flagged = flagged[['state', 'district', 'bio_ratio', 'anomaly_score']].astype({'state': str})
+    else:
+        flagged = pd.DataFrame(columns=['state', 'district', 'bio_ratio', 'anomaly_score'])
+    tables['anomalies'] = pd.concat([flagged.assign(view=ALL), flagged.assign(view=flagged['state'])],
+                                    ignore_index=True)
+
+    digest = hashlib.sha1()
+    for name in CUBE_TABLES:
+        tables[name] = tables[name].sort_values('view', kind='stable', ignore_index=True)
+        digest.update(pd.util.hash_pandas_object(tables[name]).to_numpy().tobytes())
+    version = digest.hexdigest()[:16]
+    for name in CUBE_TABLES:
+        path = cube_path(name, version, output_dir)
+        # An unchanged cube keeps its files (they may be mapped by a running dashboard)
+        if os.path.exists(path):
+            os.utime(path)  # most recently published: pruned last
+        else:
+            feather.write_feather(tables[name], path + ".tmp", compression='uncompressed')
+            os.replace(path + ".tmp", path)
+    # The pointer is a small file nobody maps, so it can be replaced in place
+    pointer = os.path.join(output_dir, PUBLISHED_NAME)
+    with open(pointer + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+    prune_cubes(version, output_dir)
+    print(f"Dashboard cube {version} saved to {output_dir}")
+    return tables
+
+def prune_cubes(current, output_dir=OUTPUT_DIR, keep=KEEP_CUBES):
+    """Delete all but the most recent cube versions.
+
+    Files still mapped by a dashboard process can't be deleted on Windows;
+    they are left for a later run.
+    """
+    summaries = sorted(glob.glob(cube_path('summary', '*', output_dir)), key=os.path.getmtime)
+    versions = [os.path.basename(p)[len("dashboard_summary-"):-len(".arrow")] for p in summaries]
+    for version in versions[:-keep]:
+        if version == current:
+            continue
+        for name in CUBE_TABLES:
+            try:
+                os.remove(cube_path(name, version, output_dir))
+            except OSError:
+                pass
+
+def published_version(output_dir=OUTPUT_DIR):
+    """Version of the last published cube, or None if the pipeline hasn't built one (or it was pruned)."""
+    try:
+        with open(os.path.join(output_dir, PUBLISHED_NAME)) as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    if not all(os.path.exists(cube_path(name, version, output_dir)) for name in CUBE_TABLES):
+        return None
+    return version
+
+def load_cube(version=None, output_dir=OUTPUT_DIR):
+    """Memory-mapped cube tables of a version (default: the published one).
+
+    Returns {name: (table, {view: (offset, length)})}. The Arrow buffers
+    point into the OS page cache, so every process that maps the same files
+    shares one physical copy and views are zero-copy slices.
+    """
+    version = version or published_version(output_dir)
+    cube = {}
+    for name in CUBE_TABLES:
+        table = pa.ipc.open_file(pa.memory_map(cube_path(name, version, output_dir))).read_all()
+        views = table.column('view').to_numpy(zero_copy_only=False)
+        # Rows are sorted by view, so each view is the run between consecutive first positions
+        keys, starts = np.unique(views, return_index=True)
+        lengths = np.diff(np.append(starts, len(views)))
+        cube[name] = (table.drop_columns(['view']),
+                      {key: (int(start), int(length)) for key, start, length in zip(keys, starts, lengths)})
+    return cube
+
+def views(cube, name='districts'):
+    return [v for v in cube[name][1] if v != ALL]
+
+def view(cube, name, key):
+    """One view of a cube table as a zero-copy Arrow slice (empty if the view has no rows).
+
+    Convert with .to_pandas() only where a widget or chart needs a DataFrame.
+    """
+    table, offsets = cube[name]
+    if key == ALL and ALL not in offsets:
+        return table
+    return table.slice(*offsets.get(key, (0, 0)))
+
+if __name__ == "__main__":
+    from feature_store import get_features
+    from analyze_anomalies import find_outliers
+    features = get_features()
+    build_cube(pd.read_csv(os.path.join(OUTPUT_DIR, "district_clusters.csv")), find_outliers(features), features)
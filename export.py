@@ -0,0 +1,92 @@
+import os
+import glob
+import gzip
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from ingest import CACHE_DIR, CATEGORIES, KEY_COLUMNS, COUNT_COLUMNS, CHUNK_ROWS
+from artifact_cache import stable_hash
+
+# Configuration
+EXPORT_DIR = os.path.join(CACHE_DIR, "exports")
+KEEP_EXPORTS = 20
+FORMATS = {
+    'csv.gz': 'application/gzip',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+RAW_COUNTS = [c for cat in CATEGORIES for c in COUNT_COLUMNS[cat]]
+RAW_COLUMNS = ['category'] + KEY_COLUMNS + RAW_COUNTS
+
+def write_chunks(chunks, path, fmt):
+    """Write DataFrame chunks to path one at a time; only one chunk is ever in memory."""
+    # Per-thread temp file: concurrent sessions may build the same export
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    if fmt == 'parquet':
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression='zstd')
+            writer.write_table(table.cast(writer.schema))
+        if writer is None:
+            pd.DataFrame().to_parquet(tmp_path)
+        else:
+            writer.close()
+    else:
+        opener = gzip.open if fmt == 'csv.gz' else open
+        with opener(tmp_path, 'wt', newline='') as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, header=(i == 0), index=False)
+    os.replace(tmp_path, path)
+    return path
+
+def frame_chunks(df, chunk_rows=CHUNK_ROWS):
+    for i in range(0, len(df), chunk_rows):
+        yield df.iloc[i:i + chunk_rows]
+
+def raw_chunks(state=None, chunk_rows=CHUNK_ROWS, cache_dir=CACHE_DIR):
+    """Row-level cached records of a state (all states if None), every category in one schema.
+
+    Count columns of other categories are left empty (not applicable), not 0.
+    """
+    for cat in CATEGORIES:
+        path = os.path.join(cache_dir, cat)
+        if not glob.glob(os.path.join(path, "month=*", "*.parquet")):
+            continue
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        expr = ds.field('state') == state if state is not None else None
+        for batch in dataset.to_batches(columns=KEY_COLUMNS + COUNT_COLUMNS[cat], filter=expr,
+                                        batch_size=chunk_rows):
+            if batch.num_rows:
+                df = batch.to_pandas().assign(category=cat).reindex(columns=RAW_COLUMNS)
+                yield df.astype({c: 'Int64' for c in RAW_COUNTS})
+
+def export_file(name, chunks, fmt='csv.gz', export_dir=EXPORT_DIR):
+    """Path of an export, written from chunks() only if it doesn't exist yet.
+
+    name must identify the content (filter and data version); exports are
+    shared by every session that asks for the same one.
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"{stable_hash(name)}.{fmt}")
+    if not os.path.exists(path):
+        write_chunks(chunks(), path, fmt)
+        prune(export_dir)
+    else:
+        os.utime(path)
+    return path
+
+def export_bytes(name, chunks, fmt='csv.gz', export_dir=EXPORT_DIR):
+    """Contents of an export (see export_file), for download widgets that serve bytes."""
+    with open(export_file(name, chunks, fmt, export_dir), 'rb') as f:
+        return f.read()
+
+def prune(export_dir=EXPORT_DIR, keep=KEEP_EXPORTS):
+    """Keep only the most recently used exports."""
+    files = sorted((p for p in glob.glob(os.path.join(export_dir, "*")) if not p.endswith(".tmp")),
+                   key=os.path.getmtime)
+    for path in files[:-keep]:
+        os.remove(path)
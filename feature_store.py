@@ -0,0 +1,242 @@
+import os
+import sys
+import glob
+import shutil
+import hashlib
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from scipy import sparse
+from ingest import (CACHE_DIR, CATEGORIES, COUNT_COLUMNS, KEY_COLUMNS, DISTRICT_KEYS, CHUNK_ROWS,
+                    update_cache, district_table, iter_chunks, load_aggregates)
+from artifact_cache import code_version, data_version
+
+# Configuration
+FEATURE_DIR = os.path.join(CACHE_DIR, "features")
+CURRENT_NAME = "CURRENT"
+PINCODE_KEYS = DISTRICT_KEYS + ['pincode']
+LEVEL_KEYS = {'district': DISTRICT_KEYS, 'pincode': PINCODE_KEYS}
+# Leaderboards: the top RANK_K entities per metric, for all states and for each state
+RANK_METRICS = ['migration_score', 'child_catchup_ratio', 'digital_intensity', 'update_intensity', 'bio_ratio']
+RANK_K = 100
+ALL_STATES = "All"
+# Only entities above this volume are ranked on the metric (ratios of small counts are noise)
+RANK_MIN_VOLUME = {'child_catchup_ratio': ('enrol_0_5', 100)}
+
+def compute_features(table, keys=DISTRICT_KEYS):
+    """Every per-entity feature used by insights, clustering, anomalies and the dashboard."""
+    df = table.set_index(keys).astype('int64')
+
+    # Volumes
+    df['total_enrol'] = df['enrol_0_5'] + df['enrol_5_17'] + df['enrol_18_plus']
+    df['total_bio'] = df['bio_update_child'] + df['bio_update_adult']
+    df['total_demo'] = df['demo_update_child'] + df['demo_update_adult']
+    df['total_updates'] = df['total_bio'] + df['total_demo']
+
+    # Migration Hotspots: high demographic updates (address change) relative to
+    # static biometric updates implies migration. +1 avoids div by zero.
+    df['migration_score'] = df['total_demo'] / (df['total_bio'] + 1)
+
+    # Child Enrolment Lag: 5-17 vs 0-5 enrolments. High ratio = late (catch-up)
+    # enrolment, low ratio = early capture.
+    df['child_catchup_ratio'] = df['enrol_5_17'] / (df['enrol_0_5'] + 1)
+    df['child_share'] = (df['enrol_0_5'] + df['enrol_5_17']) / (df['total_enrol'] + 1)
+
+    # Digital Maturity: absolute update volume, and updates per new enrolment
+    df['digital_intensity'] = df['total_updates']
+    df['update_intensity'] = df['total_updates'] / (df['total_enrol'] + 1)
+
+    # Biometric updates per infant enrolment (anomaly signal)
+    df['bio_ratio'] = df['total_bio'] / (df['enrol_0_5'] + 1)
+    return df
+
+def activity_matrix(index, cache_dir=CACHE_DIR):
+    """Sparse (entity x day) matrix of total daily activity across all categories.
+
+    Rows follow `index` (e.g. the pincode feature index). Each cached chunk is
+    folded in as its own CSR matrix, so memory follows the non-zero cells.
+    """
+    dates = pd.concat([agg['date'] for agg in load_aggregates(cache_dir=cache_dir).values()]).dropna()
+    days = pd.date_range(dates.min(), dates.max(), freq='D')
+    matrix = sparse.csr_matrix((len(index), len(days)), dtype='float64')
+    for cat in CATEGORIES:
+        for chunk in iter_chunks(cat, KEY_COLUMNS + COUNT_COLUMNS[cat], cache_dir=cache_dir):
+            chunk = chunk.dropna(subset=['date'])
+            rows = index.get_indexer(pd.MultiIndex.from_frame(chunk[list(index.names)]))
+            cols = ((chunk['date'] - days[0]) // pd.Timedelta(days=1)).to_numpy()
+            vals = chunk[COUNT_COLUMNS[cat]].sum(axis=1).to_numpy(dtype='float64')
+            matrix = matrix + sparse.csr_matrix((vals, (rows, cols)), shape=matrix.shape)
+    return matrix, days
+
+def temporal_features(df, matrix):
+    """Burstiness signals from the activity matrix (enrolment-centre patterns)."""
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    df['active_days'] = matrix.getnnz(axis=1)
+    df['peak_day_share'] = matrix.max(axis=1).toarray().ravel() / (totals + 1)
+    df['daily_mean'] = totals / np.maximum(df['active_days'], 1)
+    return df
+
+def top_positions(values, candidates, k):
+    """Positions (among candidates) of the k largest values, best first, ties by position."""
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-values[candidates], k - 1)[:k]]
+    return candidates[np.lexsort((candidates, -values[candidates]))]
+
+def rank_features(features, metrics=RANK_METRICS, k=RANK_K):
+    """Ranking index of a feature table: the top k rows per metric, overall and per state.
+
+    One row per (metric, view, rank), where view is a state or ALL_STATES and
+    row is the position in features. argpartition keeps every group at
+    O(n + k log k) instead of a full sort.
+    """
+    keys = features.index.to_frame(index=False)
+    state_rows = pd.Series(np.arange(len(keys))).groupby(keys['state'].astype(str).to_numpy()).indices
+    parts = []
+    for metric in metrics:
+        if metric not in features or RANK_MIN_VOLUME.get(metric, (metric,))[0] not in features:
+            continue
+        values = features[metric].to_numpy(dtype='float64')
+        eligible = ~np.isnan(values)
+        if metric in RANK_MIN_VOLUME:
+            col, floor = RANK_MIN_VOLUME[metric]
+            eligible &= features[col].to_numpy() > floor
+        groups = [(ALL_STATES, np.flatnonzero(eligible))]
+        groups += [(state, rows[eligible[rows]]) for state, rows in sorted(state_rows.items())]
+        for view, candidates in groups:
+            rows = top_positions(values, candidates, k)
+            parts.append(pd.DataFrame({'metric': metric, 'view': view, 'rank': np.arange(1, len(rows) + 1),
+                                       'row': rows, 'value': values[rows]}))
+    table = pd.concat(parts, ignore_index=True) if parts else \
+        pd.DataFrame({'metric': [], 'view': [], 'rank': [], 'row': [], 'value': []}).astype({'rank': 'int64', 'row': 'int64'})
+    keys = keys.iloc[table['row'].to_numpy()].reset_index(drop=True).astype({'state': str, 'district': str})
+    return pd.concat([table, keys], axis=1)
+
+def index_rankings(table):
+    """(table, {(metric, view): (offset, length)}): every leaderboard is a contiguous slice."""
+    groups = table.groupby(['metric', 'view'], sort=False).indices
+    return table, {key: (int(rows[0]), len(rows)) for key, rows in groups.items()}
+
+def top_k(rankings, metric, n=10, state=None):
+    """Top n ranking rows of metric in a state (all states if None), best first.
+
+    A slice of the precomputed index, so O(n). n can be at most RANK_K.
+    """
+    if n > RANK_K:
+        raise ValueError(f"Rankings hold the top {RANK_K} only (asked for {n})")
+    table, index = rankings
+    offset, length = index.get((metric, state or ALL_STATES), (0, 0))
+    return table.iloc[offset:offset + min(n, length)]
+
+def feature_version(manifest):
+    """Features change when either the data or this module's definitions change."""
+    return f"{data_version(manifest)}-{code_version([sys.modules[__name__]])}"
+
+def feature_path(version, level='district', feature_dir=FEATURE_DIR):
+    return os.path.join(feature_dir, version, f"{level}.parquet")
+
+def matrix_path(version, level='pincode', feature_dir=FEATURE_DIR):
+    return os.path.join(feature_dir, version, f"{level}_activity.npz")
+
+def rankings_path(version, level='district', feature_dir=FEATURE_DIR):
+    return os.path.join(feature_dir, version, f"{level}_rankings.parquet")
+
+def build_features(manifest=None, level='district', feature_dir=FEATURE_DIR):
+    """Materialize the feature table of a level for the current data version, once.
+
+    level='pincode' also stores the sparse pincode x day activity matrix and
+    the temporal features derived from it. The ranking index (rank_features)
+    is stored next to the table.
+    """
+    if manifest is None:
+        manifest = update_cache()
+    version = feature_version(manifest)
+    path = feature_path(version, level, feature_dir)
+    if not os.path.exists(path):
+        print(f"Computing {level} features...")
+        keys = LEVEL_KEYS[level]
+        features = compute_features(district_table(keys=keys, manifest=manifest), keys)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if level == 'pincode':
+            matrix, days = activity_matrix(features.index)
+            features = temporal_features(features, matrix)
+            sparse.save_npz(matrix_path(version, level, feature_dir), matrix)
+            pd.Series(days).to_frame('date').to_parquet(matrix_path(version, level, feature_dir) + ".days.parquet")
+        rank_features(features).to_parquet(rankings_path(version, level, feature_dir), index=False)
+        features.to_parquet(path + ".tmp")
+        os.replace(path + ".tmp", path)
+        with open(os.path.join(feature_dir, CURRENT_NAME), "w") as f:
+            f.write(version)
+        for old in glob.glob(os.path.join(feature_dir, "*", "")):
+            if os.path.basename(os.path.dirname(old)) != version:
+                shutil.rmtree(old, ignore_errors=True)
+    return version
+
+def get_features(columns=None, version=None, level='district', feature_dir=FEATURE_DIR):
+    """Read named feature columns, indexed by the level's keys.
+
+    Only the requested columns are read from the Parquet file. Without an
+    explicit version the store is first brought up to date with the data.
+    The version, level and a hash of the key order are kept in attrs (see rankings_for).
+    """
+    if version is None:
+        version = build_features(level=level, feature_dir=feature_dir)
+    df = pd.read_parquet(feature_path(version, level, feature_dir), columns=columns)
+    df.attrs.update(feature_version=version, feature_level=level, feature_index=index_hash(df.index))
+    return df
+
+def index_hash(index):
+    """Hash of the keys in row order: changes if rows are filtered or reordered."""
+    values = pd.util.hash_pandas_object(index, index=False).to_numpy()
+    return hashlib.sha1(values.tobytes()).hexdigest()
+
+@lru_cache(maxsize=4)
+def load_rankings(version, level='district', feature_dir=FEATURE_DIR):
+    """Stored ranking index of a feature version, read once per process."""
+    return index_rankings(pd.read_parquet(rankings_path(version, level, feature_dir)))
+
+def get_rankings(version=None, level='district', feature_dir=FEATURE_DIR):
+    """Ranking index for top_k queries, bringing the store up to date without a version."""
+    if version is None:
+        version = build_features(level=level, feature_dir=feature_dir)
+    return load_rankings(version, level, feature_dir)
+
+def rankings_for(features, level='district'):
+    """Ranking index whose rows are positions in features.
+
+    The stored one for a table of this level read by get_features whose
+    rows are still the stored keys in the stored order, otherwise computed
+    in memory from the columns at hand.
+    """
+    version = features.attrs.get('feature_version')
+    stored = (version and features.attrs.get('feature_level') == level
+              and features.attrs.get('feature_index') == index_hash(features.index))
+    if stored and os.path.exists(rankings_path(version, level)):
+        return load_rankings(version, level)
+    return index_rankings(rank_features(features))
+
+def iter_features(columns, version=None, level='district', chunk_rows=CHUNK_ROWS, feature_dir=FEATURE_DIR):
+    """Stream feature columns in chunks of at most chunk_rows, indexed like get_features."""
+    if version is None:
+        version = build_features(level=level, feature_dir=feature_dir)
+    keys = LEVEL_KEYS[level]
+    parquet = pq.ParquetFile(feature_path(version, level, feature_dir))
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=keys + list(columns)):
+        # The stored pandas metadata restores the key index
+        yield batch.to_pandas()
+
+def get_activity_matrix(version=None, level='pincode', feature_dir=FEATURE_DIR):
+    """The stored sparse (entity x day) activity matrix and its day labels."""
+    if version is None:
+        version = build_features(level=level, feature_dir=feature_dir)
+    path = matrix_path(version, level, feature_dir)
+    return sparse.load_npz(path), pd.DatetimeIndex(pd.read_parquet(path + ".days.parquet")['date'])
+
+def current_version(feature_dir=FEATURE_DIR):
+    """Version last materialized by the pipeline, without touching the raw data."""
+    with open(os.path.join(feature_dir, CURRENT_NAME)) as f:
+        return f.read().strip()
+
+if __name__ == "__main__":
+    level = 'pincode' if '--pincode' in sys.argv else 'district'
+    print(f"{level.capitalize()} features at version {build_features(level=level)}")
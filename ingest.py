@@ -0,0 +1,561 @@
+import os
+import glob
+import json
+import shutil
+import hashlib
+import multiprocessing
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from validation import VALIDATION_VERSION, clean_categorical, name_key, validate
+
+# Configuration
+# The repository folder by default (it holds the data shards and analysis_results/)
+BASE_DIR = os.environ.get("UIDAI_BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_DIR = os.path.join(BASE_DIR, "analysis_results")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+MANIFEST_NAME = "manifest.json"
+DICTIONARY_NAME = "dictionary.json"
+AGGREGATE_DIR = "aggregates"
+QUARANTINE_DIR = "quarantine"
+INDEX_DIR = "index"
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+DATE_FORMAT = '%d-%m-%Y'
+CATEGORIES = ['biometric', 'demographic', 'enrolment']
+KEY_COLUMNS = ['date', 'state', 'district', 'pincode']
+AGGREGATE_KEYS = ['state', 'district', 'date']
+DISTRICT_KEYS = ['state', 'district']
+CHUNK_ROWS = 1_000_000
+WORKERS = int(os.environ.get("UIDAI_WORKERS", os.cpu_count() or 1))
+COUNT_COLUMNS = {
+    'enrolment': ['age_0_5', 'age_5_17', 'age_18_greater'],
+    'biometric': ['bio_age_5_17', 'bio_age_17_'],
+    'demographic': ['demo_age_5_17', 'demo_age_17_'],
+}
+# Names used for the count columns once the categories are merged per district
+DISTRICT_COLUMNS = {
+    'age_0_5': 'enrol_0_5', 'age_5_17': 'enrol_5_17', 'age_18_greater': 'enrol_18_plus',
+    'bio_age_5_17': 'bio_update_child', 'bio_age_17_': 'bio_update_adult',
+    'demo_age_5_17': 'demo_update_child', 'demo_age_17_': 'demo_update_adult',
+}
+
+def find_files(base_dir=BASE_DIR):
+    """Find the raw api_data_aadhar_* CSV shards under base_dir."""
+    pattern = os.path.join(base_dir, "api_data_aadhar_*", "**", "api_data_aadhar_*.csv")
+    return sorted(glob.glob(pattern, recursive=True))
+
+def classify_file(path):
+    """Return the category of a raw shard based on its filename, or None."""
+    fname = os.path.basename(path).lower()
+    for cat in CATEGORIES:
+        if cat in fname:
+            return cat
+    return None
+
+def classify_files(file_list):
+    """Classify files into Biometric, Demographic, Enrolment based on filename."""
+    categories = {cat: [] for cat in CATEGORIES}
+    for f in file_list:
+        cat = classify_file(f)
+        if cat:
+            categories[cat].append(f)
+    return categories
+
+def read_shard(path, category):
+    """Parse one raw CSV shard with explicit dtypes and the UIDAI date format.
+
+    Columns that don't parse as integers are left as strings for validate().
+    """
+    counts = COUNT_COLUMNS[category]
+    dtypes = {'date': str, 'state': str, 'district': str, 'pincode': 'int64'}
+    dtypes.update({c: 'int64' for c in counts})
+    try:
+        df = pd.read_csv(path, dtype=dtypes)
+    except ValueError:
+        # Shard contains non-numeric tokens; fall back to a lenient parse
+        df = pd.read_csv(path, dtype=str)
+    df.columns = [c.strip().lower() for c in df.columns]
+
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], format=DATE_FORMAT, errors='coerce')
+    return df[[c for c in KEY_COLUMNS + counts if c in df.columns]]
+
+def month_key(dates):
+    """Partition key (YYYY-MM) for a date column; unparseable dates go to 'unknown'."""
+    return dates.dt.strftime('%Y-%m').fillna('unknown')
+
+def write_partitions(df, category, shard_name, cache_dir=CACHE_DIR):
+    """Write a parsed shard into the category/month partitioned Parquet cache."""
+    written = []
+    for month, part in df.groupby(month_key(df['date']), sort=False):
+        part_dir = os.path.join(cache_dir, category, f"month={month}")
+        os.makedirs(part_dir, exist_ok=True)
+        part_path = os.path.join(part_dir, f"{shard_name}.parquet")
+        part.to_parquet(part_path, index=False)
+        written.append(part_path)
+    return written
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-1 of a file's contents, read in blocks."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def load_manifest(cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def load_dictionary(cache_dir=CACHE_DIR):
+    """National state/district dictionary shared by every cached table.
+
+    'canonical' maps state -> district name_key -> the spelling first seen;
+    'aliases' maps state -> other spellings of the same district -> canonical.
+    """
+    path = os.path.join(cache_dir, DICTIONARY_NAME)
+    if not os.path.exists(path):
+        return {'state': [], 'district': [], 'canonical': {}, 'aliases': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def shard_names(df):
+    """Distinct (state, district) pairs in a table."""
+    pairs = df[['state', 'district']].dropna().astype(str).drop_duplicates()
+    return {'pairs': pairs.to_numpy().tolist()}
+
+def extend_dictionary(dictionary, names):
+    """Add any new state/district names; returns True if the dictionary grew.
+
+    A district spelled differently from a known one with the same name_key
+    in the same state becomes an alias of it instead of a new district.
+    """
+    canonical = dictionary.setdefault('canonical', {})
+    aliases = dictionary.setdefault('aliases', {})
+    pairs = pd.DataFrame(names['pairs'], columns=['state', 'district'], dtype=object)
+    pairs['key'] = name_key(pairs['district'].astype(str))
+    grew = False
+    for state, district, key in pairs.itertuples(index=False):
+        known = canonical.setdefault(state, {})
+        if key not in known:
+            known[key] = district
+            grew = True
+        elif known[key] != district and aliases.get(state, {}).get(district) != known[key]:
+            aliases.setdefault(state, {})[district] = known[key]
+            grew = True
+    if grew:
+        dictionary['state'] = sorted(canonical)
+        dictionary['district'] = sorted({d for names in canonical.values() for d in names.values()})
+    return grew
+
+def alias_districts(df, dictionary):
+    """Replace district spelling variants with their canonical names."""
+    aliases = dictionary.get('aliases')
+    if not aliases or 'district' not in df.columns or 'state' not in df.columns:
+        return df
+    table = pd.Series({(s, v): c for s, variants in aliases.items() for v, c in variants.items()})
+    mask = df['district'].isin(table.index.get_level_values(1))
+    if mask.any():
+        df = df.copy()
+        keys = pd.MultiIndex.from_arrays([df.loc[mask, 'state'].astype(str), df.loc[mask, 'district'].astype(str)])
+        mapped = table.reindex(keys).to_numpy()
+        df.loc[mask, 'district'] = pd.Series(mapped, index=df.index[mask]).fillna(df.loc[mask, 'district'].astype(str))
+    return df
+
+def save_dictionary(dictionary, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, DICTIONARY_NAME), "w") as f:
+        json.dump(dictionary, f, indent=1)
+
+def apply_schema(df, category, dictionary):
+    """Cast a raw table to the canonical compact schema.
+
+    state/district become categoricals over the national dictionary (so
+    tables from different shards share codes), pincode becomes uint32 and
+    each count column the smallest unsigned integer that holds it.
+    """
+    df = alias_districts(df, dictionary).copy()
+    for col in ('state', 'district'):
+        if col in df.columns:
+            df[col] = pd.Categorical(df[col], categories=dictionary[col])
+    if 'pincode' in df.columns:
+        df['pincode'] = df['pincode'].astype('uint32')
+    if 'date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df['date'] = pd.to_datetime(df['date'], format=DATE_FORMAT, errors='coerce')
+    for col in COUNT_COLUMNS[category]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast='unsigned')
+    return df
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+def aggregate_shard(df, category):
+    """Per-(state, district, date) sums of a shard's counts, plus the raw row count."""
+    counts = COUNT_COLUMNS[category]
+    agg = df.assign(records=1).groupby(AGGREGATE_KEYS, dropna=False, observed=True)[counts + ['records']].sum()
+    return agg.reset_index()
+
+def aggregate_path(category, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, AGGREGATE_DIR, f"{category}.parquet")
+
+def load_aggregates(categories=None, cache_dir=CACHE_DIR):
+    """Stored per-(state, district, date) aggregates for each category."""
+    aggs = {}
+    for cat in categories or CATEGORIES:
+        path = aggregate_path(cat, cache_dir)
+        if os.path.exists(path):
+            aggs[cat] = pd.read_parquet(path)
+    return aggs
+
+def merge_aggregates(stored, delta, category, sign=1):
+    """Fold a shard's aggregates into (sign=1) or out of (sign=-1) the stored ones."""
+    cols = COUNT_COLUMNS[category] + ['records']
+    if sign < 0:
+        delta = delta.assign(**{c: -delta[c] for c in cols})
+    # Grouped even without stored rows: aliased district names can repeat keys within a delta
+    merged = delta if stored is None or stored.empty else pd.concat([stored, delta], ignore_index=True)
+    merged = merged.groupby(AGGREGATE_KEYS, dropna=False, observed=True)[cols].sum().reset_index()
+    # Shards that were removed or replaced leave zero-row keys behind
+    return merged[merged['records'] > 0].reset_index(drop=True)
+
+def shard_changed(path, entry):
+    """Cheap stat check first; only hash when size or mtime moved."""
+    st = os.stat(path)
+    if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime:
+        return False, entry
+    digest = file_hash(path)
+    new_entry = {'size': st.st_size, 'mtime': st.st_mtime, 'sha1': digest}
+    if entry and entry['sha1'] == digest:
+        return False, dict(entry, **new_entry)
+    return True, new_entry
+
+def quarantine_path(category, shard_name, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, QUARANTINE_DIR, category, f"{shard_name}.parquet")
+
+def drop_shard(entry, stored, dictionary, cache_dir=CACHE_DIR):
+    """Remove a shard's partitions (and quarantined rows) from the cache and its counts from the aggregates.
+
+    Partitions keep the shard's own spellings, so districts are aliased like
+    the aggregates before subtracting.
+    """
+    cat = entry['category']
+    if entry.get('quarantine') and os.path.exists(os.path.join(cache_dir, entry['quarantine'])):
+        os.remove(os.path.join(cache_dir, entry['quarantine']))
+    paths = [os.path.join(cache_dir, p) for p in entry.get('partitions', [])]
+    paths = [p for p in paths if os.path.exists(p)]
+    if paths:
+        old = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+        delta = alias_districts(aggregate_shard(old, cat), dictionary)
+        stored = merge_aggregates(stored, delta, cat, sign=-1)
+        for p in paths:
+            os.remove(p)
+    return stored
+
+def key_hashes(df):
+    """uint64 hash of each row's upsert key (date, state, district, pincode).
+
+    Districts are compared by name_key, so spelling variants of one district
+    are the same key.
+    """
+    keys = pd.DataFrame({
+        'date': df['date'].astype('datetime64[ns]'),
+        'state': df['state'].astype(str),
+        'district': clean_categorical(df['district'], name_key).astype(str),
+        'pincode': df['pincode'].astype('int64'),
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+def index_path(category, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, INDEX_DIR, f"{category}.parquet")
+
+def load_index(category, cache_dir=CACHE_DIR):
+    """Hash index of a category: one row per live key and the shard that owns it."""
+    path = index_path(category, cache_dir)
+    if not os.path.exists(path):
+        return pd.DataFrame({'key': np.array([], dtype='uint64'), 'shard': np.array([], dtype=object)})
+    return pd.read_parquet(path)
+
+def save_index(index, category, cache_dir=CACHE_DIR):
+    path = index_path(category, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    index.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+def shard_id(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def supersede(entry, keys, stored, dictionary, cache_dir=CACHE_DIR):
+    """Delete rows re-delivered by a newer shard from an older shard's partitions.
+
+    keys are the hashes now owned by the newer shard. Only the partitions of
+    the older shard are rewritten, and the removed rows are subtracted from
+    the stored aggregates. Returns (aggregates, rows removed).
+    """
+    cat = entry['category']
+    removed, kept = [], []
+    for rel in entry.get('partitions', []):
+        path = os.path.join(cache_dir, rel)
+        part = pd.read_parquet(path)
+        stale = np.isin(key_hashes(part), keys)
+        if stale.any():
+            removed.append(part[stale])
+            if stale.all():
+                os.remove(path)
+                continue
+            part[~stale].to_parquet(path, index=False)
+        kept.append(rel)
+    entry['partitions'] = kept
+    if not removed:
+        return stored, 0
+    removed = pd.concat(removed, ignore_index=True)
+    delta = alias_districts(aggregate_shard(removed, cat), dictionary)
+    return merge_aggregates(stored, delta, cat, sign=-1), len(removed)
+
+def ingest_shard(path, category, cache_dir=CACHE_DIR):
+    """Parse, validate, partition and pre-aggregate one shard.
+
+    Runs inside a worker process; only the compact per-(state, district,
+    date) aggregate and some metadata travel back to the parent. Rows that
+    fail validation are written to the quarantine side file instead.
+    """
+    raw = read_shard(path, category)
+    df, bad, issues = validate(raw, COUNT_COLUMNS[category])
+    shard_name = os.path.splitext(os.path.basename(path))[0]
+    written = write_partitions(df, category, shard_name, cache_dir)
+    quarantine = None
+    if len(bad):
+        quarantine = quarantine_path(category, shard_name, cache_dir)
+        os.makedirs(os.path.dirname(quarantine), exist_ok=True)
+        bad.to_parquet(quarantine, index=False)
+        quarantine = os.path.relpath(quarantine, cache_dir)
+    return {
+        'rows': len(df),
+        'quarantined': len(bad),
+        'issues': issues,
+        'quarantine': quarantine,
+        'partitions': [os.path.relpath(p, cache_dir) for p in written],
+        'aggregate': aggregate_shard(df, category),
+        'names': shard_names(df),
+        'keys': np.unique(key_hashes(df)),
+    }
+
+def process_pool(workers):
+    """Process pool using spawn, which is safe to start from pipeline threads."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+def map_shards(pending, cache_dir=CACHE_DIR, workers=WORKERS):
+    """Run ingest_shard over (path, category, entry) tuples, in parallel when worthwhile."""
+    if workers <= 1 or len(pending) <= 1:
+        for f, cat, _ in pending:
+            yield f, ingest_shard(f, cat, cache_dir)
+        return
+    with process_pool(min(workers, len(pending))) as pool:
+        futures = {pool.submit(ingest_shard, f, cat, cache_dir): f for f, cat, _ in pending}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def update_cache(base_dir=BASE_DIR, cache_dir=CACHE_DIR, rebuild=False, workers=WORKERS):
+    """Bring the columnar cache up to date, parsing only new or changed shards.
+
+    Rows are upserted on (category, date, state, district, pincode): when a
+    shard re-delivers keys that an older shard already holds, the newer
+    shard (by mtime) wins and the older rows are deleted in place. Removing
+    the newer shard later does not bring the older rows back; use --rebuild.
+    """
+    manifest = load_manifest(cache_dir)
+    if any(e.get('validation') != VALIDATION_VERSION for e in manifest.values()):
+        print("Validation rules changed; rebuilding the cache.")
+        rebuild = True
+    elif manifest and not os.path.isdir(os.path.join(cache_dir, INDEX_DIR)):
+        print("Cache predates the key index; rebuilding the cache.")
+        rebuild = True
+    if rebuild:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        manifest = {}
+    files = find_files(base_dir)
+    if manifest and not os.path.exists(os.path.join(cache_dir, DICTIONARY_NAME)):
+        # Cache predates the national dictionary; seed it from the aggregates
+        dictionary = load_dictionary(cache_dir)
+        for agg in load_aggregates(cache_dir=cache_dir).values():
+            extend_dictionary(dictionary, shard_names(agg))
+        save_dictionary(dictionary, cache_dir)
+
+    pending = []
+    touched = False
+    for f in files:
+        cat = classify_file(f)
+        if cat is None:
+            continue
+        changed, entry = shard_changed(f, manifest.get(f))
+        if changed:
+            pending.append((f, cat, entry))
+        elif entry is not manifest[f]:
+            # Same content, new mtime: remember it so the next run skips the hash
+            manifest[f] = entry
+            touched = True
+    present = set(files)
+    removed = [f for f in manifest if f not in present]
+    if not pending and not removed:
+        if touched:
+            save_manifest(manifest, cache_dir)
+        return manifest
+
+    aggs = load_aggregates(cache_dir=cache_dir)
+    dictionary = load_dictionary(cache_dir)
+    indexes = {cat: load_index(cat, cache_dir) for cat in CATEGORIES}
+    for f in removed:
+        entry = manifest.pop(f)
+        aggs[entry['category']] = drop_shard(entry, aggs.get(entry['category']), dictionary, cache_dir)
+        index = indexes[entry['category']]
+        indexes[entry['category']] = index[index['shard'] != shard_id(f)]
+
+    # Old partitions of changed shards must go before workers rewrite them
+    for f, cat, entry in pending:
+        if f in manifest:
+            aggs[cat] = drop_shard(manifest.pop(f), aggs.get(cat), dictionary, cache_dir)
+            indexes[cat] = indexes[cat][indexes[cat]['shard'] != shard_id(f)]
+
+    print(f"Ingesting {len(pending)} shard(s) with {max(1, min(workers, len(pending)))} worker(s)...")
+    entries = {f: (cat, entry) for f, cat, entry in pending}
+    results = dict(map_shards(pending, cache_dir, workers))
+    # Oldest delivery first (not worker completion order), so the first spelling seen is reproducible
+    order = sorted(results, key=lambda f: (entries[f][1]['mtime'], f))
+    for f in order:
+        extend_dictionary(dictionary, results[f]['names'])
+    save_dictionary(dictionary, cache_dir)
+
+    # Upsert oldest delivery first, so that the newest shard owns overlapping keys
+    owners = {(e['category'], shard_id(f)): f for f, e in manifest.items()}
+    superseded = 0
+    for f in order:
+        cat, entry = entries[f]
+        result = results[f]
+        entry.update(category=cat, rows=result['rows'], partitions=result['partitions'],
+                     quarantined=result['quarantined'], issues=result['issues'],
+                     quarantine=result['quarantine'], validation=VALIDATION_VERSION)
+        index = indexes[cat]
+        hit = np.isin(index['key'].to_numpy(), result['keys'])
+        for owner, stale in index[hit].groupby('shard'):
+            old = manifest[owners[(cat, owner)]]
+            aggs[cat], n = supersede(old, stale['key'].to_numpy(), aggs.get(cat), dictionary, cache_dir)
+            old['rows'] -= n
+            old['superseded'] = old.get('superseded', 0) + n
+            superseded += n
+        indexes[cat] = pd.concat([index[~hit], pd.DataFrame({'key': result['keys'], 'shard': shard_id(f)})],
+                                 ignore_index=True)
+        aggs[cat] = merge_aggregates(aggs.get(cat), alias_districts(result['aggregate'], dictionary), cat)
+        manifest[f] = entry
+        owners[(cat, shard_id(f))] = f
+
+    os.makedirs(os.path.join(cache_dir, AGGREGATE_DIR), exist_ok=True)
+    for cat, agg in aggs.items():
+        agg.to_parquet(aggregate_path(cat, cache_dir), index=False)
+    for cat, index in indexes.items():
+        save_index(index, cat, cache_dir)
+    # The manifest is written last so an interrupted run re-ingests its shards
+    save_manifest(manifest, cache_dir)
+    print(f"Cache updated: {len(pending)} shard(s) ingested, {len(removed)} removed, "
+          f"{len(files) - len(pending)} unchanged.")
+    if superseded:
+        print(f"{superseded:,} row(s) of older shards replaced by re-delivered data.")
+    report = quality_report({f: manifest[f] for f in entries})
+    if not report.empty:
+        print(f"Data quality issues in ingested shards (quarantined under {QUARANTINE_DIR}/):")
+        print(report.to_string())
+    return manifest
+
+def quality_report(manifest):
+    """Validation issue counts per category (rows), by reason (columns)."""
+    rows = [dict(e.get('issues', {}), category=e['category']) for e in manifest.values() if e.get('issues')]
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows).groupby('category').sum().astype('int64')
+
+def load_data(categories=None, cache_dir=CACHE_DIR, manifest=None):
+    """Load the raw tables from the columnar cache.
+
+    Without a manifest (the result of update_cache) any new shards are
+    ingested first.
+    """
+    if manifest is None:
+        update_cache(cache_dir=cache_dir)
+    dfs = {}
+    dictionary = load_dictionary(cache_dir)
+    for cat in categories or CATEGORIES:
+        path = os.path.join(cache_dir, cat)
+        if not glob.glob(os.path.join(path, "month=*", "*.parquet")):
+            continue
+        raw = pd.read_parquet(path, columns=KEY_COLUMNS + COUNT_COLUMNS[cat])
+        before = memory_mb(raw)
+        dfs[cat] = apply_schema(raw, cat, dictionary)
+        del raw
+        print(f"Loaded {cat}: {len(dfs[cat]):,} rows, "
+              f"{before:.1f} MB -> {memory_mb(dfs[cat]):.1f} MB in compact schema")
+    return dfs
+
+def iter_chunks(category, columns=None, chunk_rows=CHUNK_ROWS, cache_dir=CACHE_DIR):
+    """Yield a category's cached rows as DataFrames of at most chunk_rows rows."""
+    path = os.path.join(cache_dir, category)
+    if not glob.glob(os.path.join(path, "month=*", "*.parquet")):
+        return
+    if columns is None:
+        columns = KEY_COLUMNS + COUNT_COLUMNS[category]
+    dictionary = load_dictionary(cache_dir)
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    for batch in dataset.to_batches(columns=columns, batch_size=chunk_rows):
+        if batch.num_rows:
+            yield apply_schema(batch.to_pandas(), category, dictionary)
+
+def stream_aggregate(category, keys=DISTRICT_KEYS, chunk_rows=CHUNK_ROWS, cache_dir=CACHE_DIR):
+    """Sum a category's counts per key, folding one chunk at a time.
+
+    Only the accumulator (one row per key) and the current chunk are held in
+    memory, so peak usage scales with the number of keys, not raw rows.
+    """
+    keys = list(keys)
+    counts = COUNT_COLUMNS[category]
+    acc = None
+    for chunk in iter_chunks(category, keys + counts, chunk_rows, cache_dir):
+        partial = chunk.groupby(keys, observed=True, dropna=False)[counts].sum()
+        acc = partial if acc is None else acc.add(partial, fill_value=0)
+    if acc is None:
+        empty = pd.MultiIndex.from_arrays([[]] * len(keys), names=keys)
+        return pd.DataFrame(columns=counts, index=empty, dtype='int64')
+    return acc.astype('int64')
+
+def district_table(keys=DISTRICT_KEYS, chunk_rows=CHUNK_ROWS, cache_dir=CACHE_DIR, manifest=None):
+    """Merged per-district counts for all categories, built by streaming aggregation.
+
+    Categories with no shards contribute zero columns. pincode is a key, not a
+    measure, so it is never summed. Without a manifest the cache is brought
+    up to date first.
+    """
+    if manifest is None:
+        update_cache(cache_dir=cache_dir)
+    frames = []
+    for cat in CATEGORIES:
+        agg = stream_aggregate(cat, keys, chunk_rows, cache_dir)
+        frames.append(agg.rename(columns=DISTRICT_COLUMNS))
+    merged = pd.concat(frames, axis=1).fillna(0).astype('int64')
+    return merged.sort_index().reset_index()
+
+if __name__ == "__main__":
+    import sys
+    manifest = update_cache(rebuild='--rebuild' in sys.argv)
+    if '--report' in sys.argv:
+        report = quality_report(manifest)
+        print(report.to_string() if not report.empty else "No data quality issues.")
@@ -0,0 +1,288 @@
+import os
+import sys
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import ingest
+import feature_store
+import analyze_aadhaar
+import analyze_anomalies
+import analyze_predictions
+import daily_store
+import reports
+from ingest import update_cache, load_aggregates
+from feature_store import build_features, get_features
+from analyze_aadhaar import generate_eda_plots
+from analyze_insights import analyze_insights
+from analyze_clustering import run_kmeans
+from analyze_anomalies import find_outliers, score_new_days, daily_features
+from analyze_predictions import build_panel, get_training_data, run_forecast, save_report, district_forecasts
+from dashboard_cube import build_cube
+from daily_store import build_daily_store
+from scenarios import INPUTS_NAME, build_inputs
+from reports import report_files
+from artifact_cache import stable_hash, code_version, data_version, load_artifact, save_artifact
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# A stage runs func(*results of deps, **params) once all of its deps have finished.
+# cache: store the result (and the report files in outputs) under the stage key.
+# fingerprint: derives the stage key from its result instead (used for ingest).
+# code: modules whose source versions the stage; defaults to func's module.
+Stage = namedtuple('Stage', ['name', 'func', 'deps', 'params', 'outputs', 'cache', 'fingerprint', 'code'],
+                   defaults=[(), {}, (), True, None, None])
+
+# Stage statuses that count as a successful run
+SUCCESS = ('ok', 'cached')
+
+# Only the ingest stage updates the cache; the other stages read what it produced
+def forecast(manifest, **params):
+    df = get_training_data(load_aggregates())
+    if df.empty:
+        print("Data loading failed or empty.")
+        return None
+    preds = run_forecast(df, **params)
+    if preds is not None:
+        save_report(preds)
+    return preds
+
+def eda_plots(manifest):
+    return generate_eda_plots(load_aggregates())
+
+def daily_anomalies(manifest, **params):
+    return score_new_days(daily_features(load_aggregates(['enrolment', 'biometric'])), **params)
+
+def district_forecast(manifest, clusters=None, **params):
+    return district_forecasts(build_panel(load_aggregates()), clusters, **params)
+
+# Only the pooled mode uses the cluster labels
+DISTRICT_FORECAST_PARAMS = {'mode': 'district', 'horizons': [7, 30]}
+
+STAGES = [
+    Stage('ingest', update_cache, cache=False, fingerprint=data_version),
+    # The feature store persists its own table per data version
+    Stage('district_features', lambda manifest: get_features(version=build_features(manifest)), ['ingest'],
+          cache=False, code=[ingest, feature_store]),
+    Stage('insights', analyze_insights, ['district_features'], outputs=report_files('findings')),
+    Stage('clustering', run_kmeans, ['district_features'], {'n_clusters': 4},
+          outputs=['district_clusters.csv']),
+    Stage('anomalies', find_outliers, ['district_features'], {'contamination': 0.01},
+          outputs=report_files('anomaly_report')),
+    # Uncached: the cube files are content-addressed and cheap to rebuild, and a restored
+    # pointer could name a version whose files were already pruned
+    Stage('dashboard_cube', build_cube, ['clustering', 'anomalies', 'district_features'], cache=False),
+    # Date-partitioned daily series behind the dashboard's trend view. The store persists
+    # itself per data version and repoints CURRENT, so it runs on every pipeline run.
+    Stage('daily_store', build_daily_store, ['ingest'], cache=False, code=[ingest, daily_store]),
+    Stage('daily_anomalies', daily_anomalies, ['ingest'], {'contamination': 0.01, 'reference_days': 90},
+          outputs=report_files('daily_anomaly_report'), code=[analyze_anomalies]),
+    Stage('forecast', forecast, ['ingest'], {'n_estimators': 100},
+          outputs=report_files('prediction_report'), code=[analyze_predictions]),
+    Stage('district_forecast', district_forecast,
+          ['ingest'] + (['clustering'] if DISTRICT_FORECAST_PARAMS['mode'] == 'cluster' else []),
+          DISTRICT_FORECAST_PARAMS,
+          outputs=['district_forecasts.csv'], code=[analyze_predictions]),
+    # Baseline rows for the dashboard's Resource Simulator
+    Stage('scenario_inputs', build_inputs, ['forecast', 'clustering'], outputs=[INPUTS_NAME]),
+    Stage('eda_plots', eda_plots, ['ingest'], code=[analyze_aadhaar],
+          outputs=['activity_over_time.png'] + [f"top_states_{c}.png" for c in ingest.CATEGORIES]),
+]
+
+# Optional pincode granularity (python pipeline.py --pincode)
+PINCODE_STAGES = [
+    Stage('pincode_features', lambda manifest: get_features(version=build_features(manifest, level='pincode'),
+                                                            level='pincode'),
+          ['ingest'], cache=False, code=[ingest, feature_store]),
+    Stage('pincode_clustering', run_kmeans, ['pincode_features'],
+          {'n_clusters': 8, 'level': 'pincode', 'mode': 'minibatch', 'sweep': list(range(2, 13))},
+          outputs=['pincode_clusters.csv']),
+    Stage('pincode_anomalies', find_outliers, ['pincode_features'], {'contamination': 0.01, 'level': 'pincode'},
+          outputs=report_files('pincode_anomaly_report')),
+]
+
+def rss_mb():
+    """Resident set size of this process in MB, or None if it can't be read."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1e6
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class MemorySampler(threading.Thread):
+    """Polls RSS and tracks the high-water mark seen while each stage is running."""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peaks = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def start_stage(self, name):
+        with self.lock:
+            self.peaks[name] = rss_mb()
+
+    def end_stage(self, name):
+        self.sample()
+        with self.lock:
+            return self.peaks.pop(name)
+
+    def sample(self):
+        current = rss_mb()
+        if current is None:
+            return
+        with self.lock:
+            for name, peak in self.peaks.items():
+                self.peaks[name] = max(peak or 0, current)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+def resolve(stages, targets=None):
+    """Stages needed for targets (all by default), checking the graph is a DAG."""
+    by_name = {s.name: s for s in stages}
+    needed, visiting = {}, set()
+
+    def visit(name):
+        if name in needed:
+            return
+        if name not in by_name:
+            raise ValueError(f"Unknown stage: {name}")
+        if name in visiting:
+            raise ValueError(f"Cycle in pipeline at stage: {name}")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        needed[name] = by_name[name]
+
+    for name in targets or by_name:
+        visit(name)
+    return list(needed.values())
+
+def stage_key(stage, dep_keys, fingerprint=None):
+    """Key of a stage: its name, params, code version and upstream keys."""
+    code = list(stage.code or [sys.modules[stage.func.__module__]])
+    # Reports and plots are rendered by the reports module, in the configured formats
+    if any(o.endswith('.png') or o.rsplit('.', 1)[-1] in reports.REPORT_FORMATS for o in stage.outputs):
+        code.append(reports)
+    return stable_hash(stage.name, stage.params, code_version(code), dep_keys, fingerprint, list(stage.outputs))
+
+def execute_stages(stages, results, report, max_workers, on_success=None):
+    """Run stages on a thread pool, starting each as soon as its deps are done."""
+    waiting = {s.name: s for s in stages}
+    running = {}
+    sampler = MemorySampler()
+    sampler.start()
+
+    def execute(stage):
+        sampler.start_stage(stage.name)
+        start = time.perf_counter()
+        try:
+            return stage.func(*[results[d] for d in stage.deps], **stage.params)
+        finally:
+            report[stage.name] = {
+                'seconds': time.perf_counter() - start,
+                'peak_mb': sampler.end_stage(stage.name),
+            }
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while waiting or running:
+            for name, stage in list(waiting.items()):
+                failed = [d for d in stage.deps if report.get(d, {}).get('status') in ('failed', 'skipped')]
+                if failed:
+                    report[name] = {'status': 'skipped', 'seconds': 0.0, 'peak_mb': None}
+                    del waiting[name]
+                elif all(d in results for d in stage.deps):
+                    running[pool.submit(execute, stage)] = name
+                    del waiting[name]
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    report[name]['status'] = 'ok'
+                except Exception as e:
+                    print(f"[FAIL]: stage '{name}': {e!r}")
+                    report[name]['status'] = 'failed'
+                    continue
+                if on_success:
+                    on_success(name)
+
+    sampler.stopped.set()
+
+def run_pipeline(stages=STAGES, targets=None, max_workers=4, use_cache=True):
+    """Run the stage graph in-process.
+
+    Intermediate results stay in memory and are handed to every dependent
+    stage. With use_cache, a stage whose key (data version, params, code
+    version, upstream keys) matches a stored artifact is loaded instead of
+    recomputed, and uncached intermediates that nothing needs are not run.
+    Returns (results, report) where report has one row per stage with its
+    status, wall time and peak RSS.
+    """
+    stages = resolve(stages, targets)
+    by_name = {s.name: s for s in stages}
+    results, report, keys = {}, {}, {}
+
+    # 1. Stages that define the data version run first; every other key derives from theirs
+    execute_stages([s for s in stages if s.fingerprint], results, report, max_workers)
+    for s in stages:
+        if s.fingerprint and s.name not in results:
+            continue
+        if any(d not in keys for d in s.deps):
+            continue
+        fingerprint = s.fingerprint(results[s.name]) if s.fingerprint else None
+        keys[s.name] = stage_key(s, [keys[d] for d in s.deps], fingerprint)
+
+    # 2. Reuse stored artifacts
+    if use_cache:
+        for s in stages:
+            if s.cache and s.name in keys:
+                start = time.perf_counter()
+                hit, value = load_artifact(s.name, keys[s.name])
+                if hit:
+                    results[s.name] = value
+                    report[s.name] = {'status': 'cached', 'seconds': time.perf_counter() - start, 'peak_mb': None}
+
+    # 3. Work out what still has to run; uncached intermediates only if a consumer runs
+    # (uncached final stages, which keep their own per-version store, always run)
+    needed = set()
+    for s in reversed(stages):
+        if s.name in report:
+            continue
+        consumers = [t for t in stages if s.name in t.deps and t.name in needed]
+        final = not any(s.name in t.deps for t in stages)
+        if s.cache or s.name in (targets or ()) or consumers or final:
+            needed.add(s.name)
+
+    def store(name):
+        stage = by_name[name]
+        if use_cache and stage.cache and name in keys:
+            save_artifact(name, keys[name], results[name], stage.outputs)
+
+    execute_stages([s for s in stages if s.name in needed], results, report, max_workers, store)
+    return results, report
+
+def print_report(report):
+    print("\nStage                 Status    Time (s)   Peak RSS (MB)")
+    for name, row in report.items():
+        peak = f"{row['peak_mb']:.0f}" if row.get('peak_mb') else "-"
+        print(f"{name:<21} {row['status']:<9} {row['seconds']:>8.2f}   {peak:>13}")
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    stages = STAGES + PINCODE_STAGES if '--pincode' in sys.argv else STAGES
+    results, report = run_pipeline(stages, targets=args or None, use_cache='--no-cache' not in sys.argv)
+    print_report(report)
+    sys.exit(0 if all(r['status'] in SUCCESS for r in report.values()) else 1)
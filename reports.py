@@ -0,0 +1,138 @@
+import os
+import json
+import html
+import inspect
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from ingest import OUTPUT_DIR, CACHE_DIR
+from artifact_cache import stable_hash
+
+# Configuration
+REPORT_FORMATS = os.environ.get("UIDAI_REPORT_FORMATS", "md").split(",")
+RENDER_INDEX = os.path.join(CACHE_DIR, "rendered.json")
+PLOT_WORKERS = 4
+
+# A table block: columns is a list of (column, header, printf-style format)
+Table = namedtuple('Table', ['frame', 'columns'])
+# A plot: draw(ax, data) fills a matplotlib Axes; data is what the plot depends on
+Plot = namedtuple('Plot', ['name', 'draw', 'data', 'figsize'], defaults=[(10, 6)])
+
+def report_files(stem, formats=None):
+    """Output file names of a report in every configured format."""
+    return [f"{stem}.{fmt}" for fmt in formats or REPORT_FORMATS]
+
+def format_cells(table):
+    """Table cells as strings, formatted a whole column at a time."""
+    cells = {}
+    for col, header, fmt in table.columns:
+        values = table.frame[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            cells[header] = values.dt.strftime(fmt).to_numpy(dtype=object)
+        elif fmt == '%s':
+            cells[header] = values.astype(str).to_numpy(dtype=object)
+        else:
+            numbers = values.to_numpy(dtype='float64')
+            if 'd' in fmt:
+                numbers = numbers.astype('int64')
+            cells[header] = np.char.mod(fmt, numbers).astype(object)
+    return pd.DataFrame(cells, index=range(len(table.frame)))
+
+def markdown_table(table):
+    cells = format_cells(table)
+    head = "| " + " | ".join(cells.columns) + " |\n|" + "---|" * len(cells.columns) + "\n"
+    if cells.empty:
+        return head
+    rows = reduce(lambda acc, col: acc + " | " + cells[col], cells.columns[1:], "| " + cells[cells.columns[0]])
+    return head + "\n".join(rows + " |") + "\n"
+
+def html_table(table):
+    return format_cells(table).to_html(index=False, border=0, classes='report-table') + "\n"
+
+def json_table(table):
+    frame = table.frame[[c for c, _, _ in table.columns]]
+    return json.loads(frame.to_json(orient='records', date_format='iso'))
+
+def html_text(text):
+    """The small markdown subset used in reports: headings, quotes, bold and paragraphs."""
+    out = []
+    for line in text.strip().splitlines():
+        level = len(line) - len(line.lstrip('#'))
+        body = html.escape(line.lstrip('#> ').strip())
+        body = body.replace('**', '<b>', 1).replace('**', '</b>', 1) if body.count('**') >= 2 else body
+        if level:
+            out.append(f"<h{level}>{body}</h{level}>")
+        elif line.startswith('>'):
+            out.append(f"<blockquote>{body}</blockquote>")
+        elif body:
+            out.append(f"<p>{body}</p>")
+    return "\n".join(out) + "\n"
+
+def render(blocks, fmt):
+    """A report (markdown text and Table blocks) as markdown, HTML or JSON."""
+    if fmt == 'json':
+        items = [{'table': json_table(b)} if isinstance(b, Table) else {'text': b} for b in blocks]
+        return json.dumps(items, indent=1, default=str)
+    if fmt == 'html':
+        body = "".join(html_table(b) if isinstance(b, Table) else html_text(b) for b in blocks)
+        return f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"></head><body>\n{body}</body></html>\n"
+    return "".join(markdown_table(b) if isinstance(b, Table) else b for b in blocks)
+
+def write_if_changed(path, content):
+    """Write content unless the file already holds exactly it; returns True if written."""
+    data = content.encode('utf-8')
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    with open(path + ".tmp", 'wb') as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    return True
+
+def write_report(stem, blocks, formats=None, output_dir=OUTPUT_DIR):
+    """Render a report in each format to <stem>.<fmt>; unchanged files are left alone."""
+    paths = []
+    for fmt in formats or REPORT_FORMATS:
+        path = os.path.join(output_dir, f"{stem}.{fmt}")
+        write_if_changed(path, render(blocks, fmt))
+        paths.append(path)
+    return paths
+
+def plot_key(plot):
+    data = plot.data if isinstance(plot.data, (pd.Series, pd.DataFrame)) else pd.Series(plot.data)
+    return stable_hash(inspect.getsource(plot.draw), plot.figsize,
+                       int(pd.util.hash_pandas_object(data).sum()), list(data.index.names))
+
+def draw_plot(plot, path):
+    # Figure objects without pyplot's global state, so renders can run in threads
+    fig = Figure(figsize=plot.figsize)
+    plot.draw(fig.add_subplot(), plot.data)
+    fig.tight_layout()
+    fig.savefig(path)
+
+def render_plots(plots, output_dir=OUTPUT_DIR, workers=PLOT_WORKERS, index_path=RENDER_INDEX):
+    """Render plots concurrently, skipping those whose data and drawing code are unchanged."""
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    jobs = {}
+    for plot in plots:
+        path = os.path.join(output_dir, plot.name)
+        key = plot_key(plot)
+        if index.get(path) != key or not os.path.exists(path):
+            jobs[path] = (plot, key)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        for path, future in [(p, pool.submit(draw_plot, plot, p)) for p, (plot, _) in jobs.items()]:
+            future.result()
+            index[path] = jobs[path][1]
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(index_path + ".tmp", index_path)
+    print(f"Rendered {len(jobs)} of {len(plots)} plot(s); {len(plots) - len(jobs)} unchanged.")
+    return [os.path.join(output_dir, p.name) for p in plots]
@@ -0,0 +1,94 @@
+import os
+from functools import lru_cache
+import joblib
+import numpy as np
+import pandas as pd
+from ingest import OUTPUT_DIR
+from analyze_predictions import MODEL_DIR, FEATURES
+
+# Configuration
+INPUTS_NAME = "scenario_inputs.parquet"
+MODEL_NAME = "forecast.joblib"
+SCENARIO_CACHE = 256
+
+def build_inputs(preds, clusters, output_dir=OUTPUT_DIR):
+    """Per-district scenario baseline: the forecaster's next-day feature row and total enrolments.
+
+    preds is the run_forecast output (latest active day per district, lags
+    already rolled forward) and clusters the district_clusters table.
+    """
+    print("Building scenario inputs...")
+    clusters = clusters[['state', 'district', 'total_enrol']].astype({'state': str, 'district': str})
+    if preds is None or preds.empty:
+        inputs = clusters.reindex(columns=['state', 'district', 'total_enrol'] + FEATURES)
+    else:
+        inputs = clusters.merge(preds[['state', 'district'] + FEATURES].astype({'state': str, 'district': str}),
+                                on=['state', 'district'], how='left')
+    inputs = inputs.sort_values(['state', 'district'], ignore_index=True)
+    output_file = os.path.join(output_dir, INPUTS_NAME)
+    inputs.to_parquet(output_file, index=False)
+    print(f"Scenario inputs saved to {output_file}")
+    return inputs
+
+def inputs_version(output_dir=OUTPUT_DIR, model_dir=MODEL_DIR):
+    """Changes whenever the pipeline writes new inputs or a new model; None if either is missing."""
+    try:
+        return (os.path.getmtime(os.path.join(output_dir, INPUTS_NAME)),
+                os.path.getmtime(os.path.join(model_dir, MODEL_NAME)))
+    except OSError:
+        return None
+
+@lru_cache(maxsize=1)
+def load_engine(version, output_dir=OUTPUT_DIR, model_dir=MODEL_DIR):
+    """(inputs, model, baseline prediction) for an inputs_version, loaded once per process."""
+    inputs = pd.read_parquet(os.path.join(output_dir, INPUTS_NAME))
+    model = joblib.load(os.path.join(model_dir, MODEL_NAME))['model']
+    # Scenario batches are a few hundred rows: threads cost more than they save
+    model.set_params(n_jobs=1)
+    baseline = predict(model, inputs)
+    return inputs, model, baseline
+
+def predict(model, inputs):
+    """Forecast migration score for every row with features; NaN where the district has no history."""
+    out = np.full(len(inputs), np.nan)
+    known = inputs[FEATURES].notna().all(axis=1).to_numpy()
+    if known.any():
+        out[known] = model.predict(inputs.loc[known, FEATURES])
+    return out
+
+def apply_scenario(inputs, camp, staff):
+    """Feature rows under a scenario; camp/staff are per-row fractional increases.
+
+    Camps add enrolment counters; extra staff raises throughput of every
+    service (enrolment, biometric and demographic updates).
+    """
+    scenario = inputs.copy()
+    scenario['enrolment'] *= (1 + camp) * (1 + staff)
+    scenario['biometric'] *= 1 + staff
+    scenario['prev_demo'] *= 1 + staff
+    return scenario
+
+@lru_cache(maxsize=SCENARIO_CACHE)
+def evaluate(version, state=None, targets=(), camp_pct=0, staff_pct=0):
+    """Resource plan for one scenario, memoized per (version, filter, slider values).
+
+    Boosts apply to the target districts of the state (all of them if
+    targets is empty), and every scenario is scored in one vectorized
+    model.predict call. The returned frame is shared: don't modify it.
+    """
+    inputs, model, baseline = load_engine(version)
+    rows = np.ones(len(inputs), dtype=bool) if state is None else (inputs['state'] == state).to_numpy()
+    inputs, baseline = inputs[rows].reset_index(drop=True), baseline[rows]
+    boosted = inputs['district'].isin(targets).to_numpy() if targets else np.ones(len(inputs), dtype=bool)
+    camp = np.where(boosted, camp_pct / 100, 0.0)
+    staff = np.where(boosted, staff_pct / 100, 0.0)
+
+    plan = inputs[['state', 'district', 'total_enrol']].copy()
+    plan['camp_boost_pct'] = camp * 100
+    plan['staff_boost_pct'] = staff * 100
+    plan['projected_enrol'] = plan['total_enrol'] * (1 + camp) * (1 + staff)
+    plan['extra_enrol'] = plan['projected_enrol'] - plan['total_enrol']
+    plan['baseline_mig_score'] = baseline
+    plan['scenario_mig_score'] = predict(model, apply_scenario(inputs, camp, staff))
+    plan['mig_score_change'] = plan['scenario_mig_score'] - plan['baseline_mig_score']
+    return plan
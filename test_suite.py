@@ -1,18 +1,8 @@
 import os
-import sys
-import subprocess
+import tempfile
 import pandas as pd
-
-# Configuration
-BASE_DIR = r"z:\UIDAI"
-OUTPUT_DIR = os.path.join(BASE_DIR, "analysis_results")
-SCRIPTS = [
-    "analyze_aadhaar.py",
-    "analyze_insights.py",
-    "analyze_predictions.py",
-    "analyze_clustering.py",
-    "analyze_anomalies.py"
-]
+from ingest import OUTPUT_DIR, update_cache, load_aggregates, stream_aggregate
+from pipeline import SUCCESS, run_pipeline, print_report
 
 EXPECTED_FILES = [
     "activity_over_time.png",
@@ -23,22 +13,6 @@ EXPECTED_FILES = [
     "anomaly_report.md"
 ]
 
-def run_script(script_name):
-    print(f"Testing {script_name}...")
-    try:
-        path = os.path.join(BASE_DIR, script_name)
-        result = subprocess.run([sys.executable, path], capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"[FAIL]: {script_name}")
-            print(result.stderr)
-            return False
-        else:
-            print(f"[PASS]: {script_name}")
-            return True
-    except Exception as e:
-        print(f"[ERROR]: Could not run {script_name}: {e}")
-        return False
-
 def verify_outputs():
     print("\nVerifying Artifacts...")
     all_exists = True
@@ -72,20 +46,60 @@ def verify_outputs():
             
     return all_exists
 
+def write_shard(base_dir, name, district, count, mtime, pincode=None):
+    folder = os.path.join(base_dir, "api_data_aadhar_enrolment")
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"api_data_aadhar_enrolment_{name}.csv")
+    pd.DataFrame({'date': ['30-12-2025'], 'state': ['Gujarat'], 'district': [district], 'pincode': [pincode or 385001 + int(name)],
+                  'age_0_5': [count], 'age_5_17': [0], 'age_18_greater': [0]}).to_csv(path, index=False)
+    os.utime(path, (mtime, mtime))
+    return path
+
+def verify_upserts():
+    """Re-delivered, superseded and removed shards keep the aggregates equal to the rows."""
+    print("\nVerifying Incremental Ingest...")
+    ok = True
+    with tempfile.TemporaryDirectory() as base_dir:
+        cache_dir = os.path.join(base_dir, "cache")
+        def check(step, expected, workers=1):
+            nonlocal ok
+            update_cache(base_dir, cache_dir, workers=workers)
+            agg = load_aggregates(['enrolment'], cache_dir).get('enrolment', pd.DataFrame(columns=['age_0_5']))
+            rows = stream_aggregate('enrolment', cache_dir=cache_dir)
+            totals = (int(agg['age_0_5'].sum()), int(rows['age_0_5'].sum()) if not rows.empty else 0)
+            if totals == (expected, expected):
+                print(f"[OK]: {step}: aggregates match the cached rows ({expected}).")
+            else:
+                print(f"[DATA ERROR]: {step}: aggregates {totals[0]}, rows {totals[1]}, expected {expected}.")
+                ok = False
+        write_shard(base_dir, "1", "Banas Kantha", 7, 1_000_000)
+        second = write_shard(base_dir, "2", "Banaskantha", 7, 2_000_000)
+        check("Two spellings", 14)
+        write_shard(base_dir, "2", "Banaskantha", 9, 3_000_000)
+        check("Re-delivered shard", 16)
+        os.remove(second)
+        check("Removed shard", 7)
+        # A newer shard with another name re-delivers the first shard's key: newest wins
+        write_shard(base_dir, "3", "Banas Kantha", 5, 4_000_000, pincode=385002)
+        check("Superseding shard", 5)
+        # Both deliveries of a key in one parallel batch
+        write_shard(base_dir, "4", "Banas Kantha", 3, 5_000_000, pincode=385100)
+        write_shard(base_dir, "5", "Banas Kantha", 4, 6_000_000, pincode=385100)
+        check("Superseding shard in one batch", 9, workers=2)
+    return ok
+
 def main():
     print("Starting Pre-Submission Test Suite")
     
-    # 1. Run Pipeline
-    pipeline_success = True
-    for script in SCRIPTS:
-        if not run_script(script):
-            pipeline_success = False
-            break # Stop on error
+    # 1. Run Pipeline (in-process, shared intermediates, independent stages in parallel)
+    _, report = run_pipeline()
+    print_report(report)
+    pipeline_success = all(r['status'] in SUCCESS for r in report.values())
             
     if pipeline_success:
         print("\n---------------------------------------")
         # 2. Verify Outputs
-        if verify_outputs():
+        if verify_outputs() and verify_upserts():
             print("\n[RESULT]: SYSTEM STABLE. READY FOR SUBMISSION.")
         else:
             print("\n[RESULT]: PIPELINE RAN BUT ARTIFACTS ARE MISSING/INVALID.")
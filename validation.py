@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+# Canonical states and union territories (post-2020 boundaries)
+STATES = [
+    'Andaman and Nicobar Islands', 'Andhra Pradesh', 'Arunachal Pradesh', 'Assam', 'Bihar', 'Chandigarh',
+    'Chhattisgarh', 'Dadra and Nagar Haveli and Daman and Diu', 'Delhi', 'Goa', 'Gujarat', 'Haryana',
+    'Himachal Pradesh', 'Jammu and Kashmir', 'Jharkhand', 'Karnataka', 'Kerala', 'Ladakh', 'Lakshadweep',
+    'Madhya Pradesh', 'Maharashtra', 'Manipur', 'Meghalaya', 'Mizoram', 'Nagaland', 'Odisha', 'Puducherry',
+    'Punjab', 'Rajasthan', 'Sikkim', 'Tamil Nadu', 'Telangana', 'Tripura', 'Uttar Pradesh', 'Uttarakhand',
+    'West Bengal',
+]
+# Old names and misspellings, by name_key
+STATE_ALIASES = {
+    'orissa': 'Odisha',
+    'pondicherry': 'Puducherry',
+    'westbangal': 'West Bengal',
+    'uttaranchal': 'Uttarakhand',
+    'chattisgarh': 'Chhattisgarh',
+    'nctofdelhi': 'Delhi',
+    'dadraandnagarhaveli': 'Dadra and Nagar Haveli and Daman and Diu',
+    'damananddiu': 'Dadra and Nagar Haveli and Daman and Diu',
+}
+# Valid Indian PIN codes start with 11 (Delhi) through 85 (Bihar/Jharkhand)
+PINCODE_RANGE = (110000, 859999)
+MIN_DATE = pd.Timestamp('2010-01-01')   # Aadhaar launch
+# Bump whenever the rules change: cached shards are then re-validated
+VALIDATION_VERSION = 1
+
+def name_key(names):
+    """Spelling-insensitive key: lowercase letters and digits only, '&' read as 'and'."""
+    return names.str.lower().str.replace('&', 'and', regex=False).str.replace(r'[^a-z0-9]', '', regex=True)
+
+STATE_KEYS = {**dict(zip(name_key(pd.Series(STATES)), STATES)), **STATE_ALIASES}
+
+def clean_names(names):
+    """Strip footnote stars and odd whitespace/dashes; title-case ALL CAPS or all-lowercase names."""
+    names = (names.str.replace('\u00a0', ' ', regex=False)
+                  .str.replace('[\u2212\u2013\u2014]|\u00e2\u0088\u0092', '-', regex=True)
+                  .str.replace('*', '', regex=False)
+                  .str.replace(r'\s+', ' ', regex=True)
+                  .str.strip())
+    shouting = names.str.isupper() | names.str.islower()
+    return names.where(~shouting, names.str.title())
+
+def clean_categorical(values, func):
+    """Apply a vectorized string function to the distinct values only."""
+    codes, uniques = pd.factorize(values)
+    mapped = func(pd.Series(uniques, dtype=object).astype(str)).to_numpy(dtype=object)
+    return pd.Series(np.where(codes >= 0, mapped[np.maximum(codes, 0)], None), index=values.index, dtype=object)
+
+def validate(df, counts, today=None):
+    """Split a parsed shard into (clean rows, quarantined rows, issue counts).
+
+    df may come from a strict or a lenient (all-string) parse. Every check
+    is a column operation; a row failing any check goes to quarantine with
+    the first failing reason. Duplicate (date, pincode) rows are kept but
+    counted, since one PIN code can span districts.
+    """
+    today = today or pd.Timestamp.today().normalize()
+    missing = [c for c in ['date', 'state', 'district', 'pincode'] + counts if c not in df.columns]
+    if missing:
+        bad = df.assign(reason=f"schema: missing {', '.join(missing)}")
+        return df.iloc[:0], bad.astype(str), {'schema': len(df)}
+
+    reason = pd.Series(None, index=df.index, dtype=object)
+    def flag(mask, why):
+        reason[mask & reason.isna()] = why
+
+    # 1. Numbers: repeated headers and stray tokens fail here
+    numeric = {}
+    for col in ['pincode'] + counts:
+        values = df[col] if pd.api.types.is_integer_dtype(df[col]) else pd.to_numeric(df[col], errors='coerce')
+        flag(values.isna(), 'non_numeric')
+        numeric[col] = values.fillna(0).astype('int64')
+    flag(pd.concat([numeric[c] < 0 for c in counts], axis=1).any(axis=1), 'negative_count')
+
+    # 2. Dates
+    dates = df['date'] if pd.api.types.is_datetime64_any_dtype(df['date']) else pd.to_datetime(df['date'], errors='coerce')
+    flag(dates.isna() | (dates < MIN_DATE) | (dates > today), 'date')
+
+    # 3. Names against the canonical states; districts must be words
+    states = clean_categorical(df['state'], lambda s: name_key(s).map(STATE_KEYS))
+    flag(states.isna(), 'state')
+    districts = clean_categorical(df['district'], clean_names)
+    flag(districts.isna() | ~districts.fillna('').str.contains('[A-Za-z]', regex=True), 'district')
+
+    # 4. PIN codes
+    pins = numeric['pincode']
+    flag((pins < PINCODE_RANGE[0]) | (pins > PINCODE_RANGE[1]), 'pincode')
+
+    # 5. Rows delivered twice verbatim (after renaming, equal rows may be distinct records)
+    flag(df.duplicated(), 'duplicate_row')
+    clean = pd.DataFrame({'date': dates, 'state': states, 'district': districts, **numeric}, index=df.index)
+
+    ok = reason.isna().to_numpy()
+    issues = reason[~ok].value_counts().to_dict()
+    clean = clean[ok].reset_index(drop=True)
+    duplicate_keys = int(clean.duplicated(['date', 'pincode']).sum())
+    if duplicate_keys:
+        issues['duplicate_date_pincode'] = duplicate_keys
+    quarantine = df[~ok].astype(str).assign(reason=reason[~ok].to_numpy())
+    return clean[['date', 'state', 'district', 'pincode'] + counts], quarantine.reset_index(drop=True), issues